@@ -1,7 +1,45 @@
 from __future__ import division
 
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
 import numpy as np
-import scipy.optimize
+
+import instrument
+from teams import TeamRegistry
+
+
+def _pythagoreanPrediction(pf, pa, x):
+    '''
+    Prediction pf**x / (pf**x + pa**x). Teams without points for or 
+    against get the limit of the formula instead of 0/0: 0 or 1 depending
+    on the sign of x, and 0.5 for x = 0 or teams without any points.
+    '''
+    pf, pa, x = np.broadcast_arrays(pf, pa, x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = np.array(pf**x / (pf**x + pa**x), dtype=np.double)
+    zero = (pf == 0) | (pa == 0)
+    if np.any(zero):
+        limit = 0.5 + 0.5 * np.sign(x) * np.sign(pf - pa)
+        f[zero] = limit[zero]
+    return f
+
+
+def _pythagoreanDerivative(pf, pa, x):
+    '''
+    Derivative of pf**x / (pf**x + pa**x) with respect to the exponent x,
+    i.e. f * (1 - f) * log(pf / pa). Teams without points for or against
+    have a constant prediction, so their derivative is zero.
+    '''
+    pf, pa = np.broadcast_arrays(pf, pa)
+    valid = (pf > 0) & (pa > 0)
+    ratio = np.ones_like(pf)
+    ratio[valid] = pf[valid] / pa[valid]
+    f = 1. / (1. + ratio**-x)
+    return np.where(valid, f * (1. - f) * np.log(ratio), 0.)
 
 
 class Pythagorean(object):
@@ -9,64 +47,130 @@ class Pythagorean(object):
     This is a super class for the different types of the 
     Pythagorean expectation. It is called with a dictionary containing 
     the teams, scores and number of played games (i.e. given week).
+    The number of played games may also be given per team.
 
+    * self.f - Formula for the prediction, self.dfdx its derivative with
+      respect to the exponent x.
     * self.calculateExponent - Formula for the exponent x.
+    * self.exponentGradient - Derivatives of the exponent with respect to
+      each fit parameter (one array per parameter).
     * self.guess - Initial guess for the optimization
+
+    All formulas are evaluated on the arrays of all teams at once.
     '''
     def __init__(self, dataDict):
         self.prediction = []
         self.power = []
-        self.f = lambda pf, pa, x: pf**x / (pf**x + pa**x)
+        self.f = _pythagoreanPrediction
+        self.dfdx = _pythagoreanDerivative
         self.calculateExponent = lambda pf, pa, x: x
+        self.exponentGradient = lambda pf, pa, x: [np.ones_like(pf)]
         self.guess = 2.0
         self.teams = dataDict['teams']
         self.pointsFor = np.double(dataDict['pointsFor'])
         self.pointsAgainst = np.double(dataDict['pointsAgainst'])
         self.wlp = np.double(dataDict['wlp'])
-        self.nGames = np.int(dataDict['nGames'])
+        self.nGames = np.asarray(dataDict['nGames'], dtype=np.int)
 	
     def getOptimalFitParams(self):
         '''
-        Returns the optimal fit parameters retrieved from scipy.optimize.fmin 
-        in calculatePythagorean().
+        Returns the optimal fit parameters found in calculatePythagorean(),
+        by default by scipy.optimize.fmin_bfgs (or scipy.optimize.fmin, 
+        if BFGS does not converge or method='fmin' is given).
         '''
         return self.xopt
         
     def __minimizeParams(self, val):
-        ssq = 0.
-        for i in np.arange(0, len(self.teams)):
-            x = self.calculateExponent(self.pointsFor[i], 
-                                       self.pointsAgainst[i], val)
-            calc = self.f(self.pointsFor[i], self.pointsAgainst[i], x)
-            ssq += (self.wlp[i] - calc)**2
-        return ssq
-    
-    def calculatePythagorean(self, optimize=True, staticParams=None):
+        x = self.calculateExponent(self.pointsFor, self.pointsAgainst, val)
+        calc = self.f(self.pointsFor, self.pointsAgainst, x)
+        ssq = np.sum((self.wlp - calc)**2)
+        # overflowing exponents must not look like an improvement to the
+        # line search of the gradient-based optimizer
+        return ssq if np.isfinite(ssq) else np.inf
+
+    def __gradient(self, val):
+        # d(ssq)/d(val) = -2 * sum(residual * df/dx * dx/dval)
+        x = self.calculateExponent(self.pointsFor, self.pointsAgainst, val)
+        calc = self.f(self.pointsFor, self.pointsAgainst, x)
+        dfdx = self.dfdx(self.pointsFor, self.pointsAgainst, x)
+        dxdval = self.exponentGradient(self.pointsFor, self.pointsAgainst, val)
+        return -2 * np.dot(dxdval, (self.wlp - calc) * dfdx)
+
+    def calculatePythagorean(self, optimize=True, staticParams=None,
+                             method='bfgs', cache=None):
         '''
         Returns the predictions and power for all given teams. 
         An optimatization for the exponent formula is performed, 
         if optimize is set to True. If set to False the static exponent 
         parameters need to be given as a list.
+        *method* selects the optimizer: 'bfgs' uses the analytic gradient
+        (scipy.optimize.fmin_bfgs) and falls back to the simplex if it does
+        not converge, 'fmin' the gradient-free Nelder-Mead simplex 
+        (scipy.optimize.fmin).
+        If a PythagoreanCache is given as *cache*, a stored result for the
+        same data, model and parameters is returned without optimizing,
+        otherwise the optimizer is started from the nearest cached fit.
         '''
+        if cache is not None:
+            key = cache.key(self, optimize, staticParams, method)
+            result = cache.get(key)
+            if result is not None:
+                if optimize:
+                    self.xopt = np.array(result['xopt'])
+                self.prediction = list(result['prediction'])
+                self.power = list(result['power'])
+                return self.prediction, self.power
+            guess = cache.warmStart(self)
+        else:
+            guess = None
+        if guess is None:
+            guess = self.guess
         if optimize:
+            # scipy is only loaded once an optimization is needed
+            import scipy.optimize
             #best fit parameters
-            self.xopt = scipy.optimize.fmin(self.__minimizeParams, 
-                                            self.guess)
-        for i in range(len(self.teams)):
-            if optimize:
-                #adjusted parameter per team
-                x = self.calculateExponent(self.pointsFor[i], 
-                                           self.pointsAgainst[i], 
-                                           self.xopt) 
-            elif not optimize and staticParams != None:
-                x = self.calculateExponent(self.pointsFor[i], 
-                                           self.pointsAgainst[i], 
-                                           staticParams)
+            stage = 'pythagoreans.optimize.%s' % method
+            if method == 'bfgs':
+                with instrument.stage(stage):
+                    result = scipy.optimize.fmin_bfgs(self.__minimizeParams,
+                                                      guess,
+                                                      fprime=self.__gradient,
+                                                      gtol=1e-8, disp=False,
+                                                      full_output=True)
+                self.xopt = result[0]
+                instrument.count(stage, 'function_evaluations', result[4])
+                instrument.count(stage, 'gradient_evaluations', result[5])
+                if result[6] != 0:
+                    # BFGS stopped without converging (e.g. the line search
+                    # failed in a flat valley), refit with the simplex and
+                    # keep the better of both fits
+                    instrument.count(stage, 'fmin_fallbacks')
+                    fallback = scipy.optimize.fmin(self.__minimizeParams,
+                                                   guess, disp=False,
+                                                   full_output=True)
+                    if fallback[1] <= result[1]:
+                        self.xopt = fallback[0]
+            elif method == 'fmin':
+                with instrument.stage(stage):
+                    result = scipy.optimize.fmin(self.__minimizeParams,
+                                                 guess, full_output=True)
+                self.xopt = result[0]
+                instrument.count(stage, 'iterations', result[2])
+                instrument.count(stage, 'function_evaluations', result[3])
             else:
-                x = None
-            self.prediction.append(self.f(self.pointsFor[i], 
-                                          self.pointsAgainst[i], x))
-            self.power.append(x)
+                raise ValueError('Unknown optimization method: %s' % method)
+            params = self.xopt
+        elif staticParams is not None:
+            params = staticParams
+        else:
+            params = None
+        #adjusted parameter per team
+        x = self.calculateExponent(self.pointsFor, self.pointsAgainst, params)
+        x = np.zeros_like(self.pointsFor) + x
+        self.prediction = list(self.f(self.pointsFor, self.pointsAgainst, x))
+        self.power = list(x)
+        if cache is not None:
+            cache.put(key, self, self.xopt if optimize else None)
         return self.prediction, self.power
         
 
@@ -77,6 +181,7 @@ class PythagoreanExpectation(Pythagorean):
     def __init__(self, dataDict):
         super(PythagoreanExpectation, self).__init__(dataDict)
         self.calculateExponent = lambda pf, pa, x: x[0]
+        self.exponentGradient = lambda pf, pa, x: [np.ones_like(pf)]
         self.guess = 2.0
         
 class Pythagenport(Pythagorean):
@@ -87,6 +192,8 @@ class Pythagenport(Pythagorean):
         super(Pythagenport, self).__init__(dataDict)
         self.calculateExponent = lambda pf, pa, x: \
             x[0]*np.log10((pf+pa)/self.nGames)+x[1]
+        self.exponentGradient = lambda pf, pa, x: \
+            [np.log10((pf+pa)/self.nGames), np.ones_like(pf)]
         self.guess = [1.5, 0.45]
         
 
@@ -98,6 +205,8 @@ class PythagenportFO(Pythagorean):
         super(PythagenportFO, self).__init__(dataDict)
         self.calculateExponent = lambda pf, pa, x: \
             x[0]*np.log10((pf+pa)/self.nGames)
+        self.exponentGradient = lambda pf, pa, x: \
+            [np.log10((pf+pa)/self.nGames)]
         self.guess = 1.5
         
         
@@ -108,5 +217,349 @@ class Pythagenpat(Pythagorean):
     def __init__(self, dataDict):
         super(Pythagenpat, self).__init__(dataDict)
         self.calculateExponent = lambda pf, pa, x: \
-            ((pf+pa)/float(self.nGames))**x[0]
+            ((pf+pa)/self.nGames)**x[0]
+        self.exponentGradient = lambda pf, pa, x: \
+            [((pf+pa)/self.nGames)**x[0] * 
+             np.log((pf+pa)/self.nGames)]
         self.guess = 0.287
+
+
+
+class PythagoreanCache(object):
+    '''
+    Cache for the results of Pythagorean.calculatePythagorean. Results are
+    keyed by a SHA-1 hash of the data arrays, the model class, the static
+    parameters and the optimizer. At most *maxSize* results are kept in 
+    memory, the least recently used are dropped first. If *directory* is 
+    given, all results are also stored there as JSON files and found 
+    again by later processes.
+    
+    Optimizations which are not in the cache are started from the fit of
+    the same model with the most similar data, e.g. the previous week of 
+    the same season (see warmStart).
+    '''
+    def __init__(self, maxSize=128, directory=None):
+        self.maxSize = maxSize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def key(self, pyth, optimize=True, staticParams=None, method='bfgs'):
+        '''
+        Returns the key of the results of *pyth* for the given arguments
+        of calculatePythagorean.
+        '''
+        sha = hashlib.sha1()
+        sha.update(type(pyth).__name__)
+        sha.update(json.dumps([bool(optimize), method,
+                               None if staticParams is None else 
+                               np.double(staticParams).tolist(),
+                               [str(team) for team in pyth.teams]]))
+        for array in [pyth.pointsFor, pyth.pointsAgainst, pyth.wlp]:
+            sha.update(np.ascontiguousarray(array, dtype=np.double).tostring())
+        sha.update(np.ascontiguousarray(pyth.nGames, 
+                                        dtype=np.int64).tostring())
+        return sha.hexdigest()
+
+    def get(self, key):
+        '''
+        Returns the result stored for *key* as dictionary with the keys 
+        xopt, prediction and power, or None.
+        '''
+        entry = self.__entries.pop(key, None)
+        if entry is None and self.directory is not None:
+            try:
+                with open(os.path.join(self.directory, key + '.json')) as f:
+                    entry = json.load(f)
+            except (IOError, ValueError):
+                # missing or unreadable entries are misses
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__store(key, entry)
+        return entry
+
+    def put(self, key, pyth, xopt):
+        '''Stores the results of *pyth* with the fit parameters *xopt*.'''
+        entry = {'model': type(pyth).__name__,
+                 'teams': [str(team) for team in pyth.teams],
+                 'features': self.__features(pyth).tolist(),
+                 'xopt': None if xopt is None else 
+                         np.atleast_1d(np.double(xopt)).tolist(),
+                 'prediction': np.double(pyth.prediction).tolist(),
+                 'power': np.double(pyth.power).tolist()}
+        self.__store(key, entry)
+        if self.directory is not None:
+            # write to a temporary file first, so that other processes 
+            # never read a half-written entry
+            fd, path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.rename(path, os.path.join(self.directory, key + '.json'))
+
+    def warmStart(self, pyth):
+        '''
+        Returns the cached xopt of the model of *pyth* whose data is 
+        closest to the data of *pyth* (only results of the same teams 
+        are compared), or the most recent xopt of the model, if there are 
+        no such results. Returns None if the model was not fitted yet.
+        '''
+        model = type(pyth).__name__
+        teams = [str(team) for team in pyth.teams]
+        features = self.__features(pyth)
+        best, bestDistance = None, np.inf
+        for entry in reversed(self.__entries.values()):
+            if entry['model'] != model or entry['xopt'] is None:
+                continue
+            if best is None:
+                best = entry['xopt']
+            if entry['teams'] == teams:
+                distance = np.sum((np.array(entry['features']) - 
+                                   features)**2)
+                if distance < bestDistance:
+                    best, bestDistance = entry['xopt'], distance
+        return None if best is None else np.array(best)
+
+    def __store(self, key, entry):
+        self.__entries[key] = entry
+        while len(self.__entries) > self.maxSize:
+            self.__entries.popitem(last=False)
+
+    def __features(self, pyth):
+        # points per game and winning percentage of all teams
+        nGames = np.maximum(np.zeros_like(pyth.pointsFor) + pyth.nGames, 1)
+        return np.concatenate((pyth.pointsFor / nGames, 
+                               pyth.pointsAgainst / nGames, pyth.wlp))
+
+
+class PythagoreanCalibration(object):
+    '''
+    Calibrates one shared parameter set of the Pythagorean *model* (e.g.
+    Pythagenport) jointly over the teams of many snapshots, e.g. the 
+    final standings of many seasons and leagues. All team-seasons are 
+    evaluated by a single vectorized objective.
+    Snapshots are added with addSnapshot, a snapshot which is added again
+    under the same label replaces the old one, e.g. the standings of the 
+    current season after a new week. Every calibration is started from 
+    the parameters of the previous one, so that a recalibration after a 
+    small update only needs a few iterations.
+    '''
+    def __init__(self, model, snapshots=None):
+        self.model = model
+        self.xopt = None
+        self.residuals = None
+        self.__labels = []
+        self.__snapshots = {}
+        for label, dataDict in sorted((snapshots or {}).iteritems()):
+            self.addSnapshot(dataDict, label)
+
+    def addSnapshot(self, dataDict, label=None):
+        '''
+        Adds the data dictionary *dataDict* under *label* (by default the
+        number of snapshots), replacing a snapshot with the same label.
+        '''
+        if label is None:
+            label = len(self.__labels)
+        if label not in self.__snapshots:
+            self.__labels.append(label)
+        self.__snapshots[label] = dataDict
+
+    def labels(self):
+        return list(self.__labels)
+
+    def calibrate(self, method='bfgs'):
+        '''
+        Fits the shared parameters to all snapshots and returns them. 
+        The fit of every team-season is kept in *self.residuals*, a record
+        array with one row per snapshot and the fields label, teams, ssq 
+        (sum of squared residuals of the winning percentage), rmse and 
+        bias (mean residual).
+        '''
+        stacked = stackDataDicts([self.__snapshots[label] 
+                                  for label in self.__labels])
+        pooled = self.model(stacked)
+        if self.xopt is not None:
+            pooled.guess = self.xopt
+        prediction = pooled.calculatePythagorean(method=method)[0]
+        self.xopt = pooled.xopt
+        residuals = pooled.wlp - np.array(prediction)
+        snapshot = stacked['snapshot']
+        nSnap = len(self.__labels)
+        teams = np.bincount(snapshot, minlength=nSnap)
+        ssq = np.bincount(snapshot, residuals**2, minlength=nSnap)
+        result = np.zeros(nSnap, dtype=[('label', object), ('teams', np.int),
+                                        ('ssq', np.double), 
+                                        ('rmse', np.double), 
+                                        ('bias', np.double)])
+        result['label'] = self.__labels
+        result['teams'] = teams
+        result['ssq'] = ssq
+        result['rmse'] = np.sqrt(ssq / np.maximum(teams, 1))
+        result['bias'] = (np.bincount(snapshot, residuals, minlength=nSnap) / 
+                          np.maximum(teams, 1))
+        self.residuals = result.view(np.recarray)
+        return self.xopt
+
+
+def stackDataDicts(dataDicts, registry=None):
+    '''
+    Stacks a list of data dictionaries (one per league snapshot, the
+    number of teams may differ) into a single dictionary of flat arrays.
+    The additional key 'snapshot' holds the index of the snapshot every
+    row belongs to and 'nGames' is expanded to one value per row.
+    The key 'teamId' holds the id of every team in the TeamRegistry 
+    *registry* (a new one, if none is given), so that the rows of a team
+    can be selected across snapshots.
+    '''
+    if registry is None:
+        registry = TeamRegistry()
+    stacked = {'teams': [], 'pointsFor': [], 'pointsAgainst': [], 'wlp': [],
+               'nGames': [], 'snapshot': []}
+    for i, dataDict in enumerate(dataDicts):
+        nTeams = len(dataDict['teams'])
+        stacked['teams'] += list(dataDict['teams'])
+        for key in ['pointsFor', 'pointsAgainst', 'wlp']:
+            stacked[key].append(np.double(dataDict[key]))
+        stacked['nGames'].append(np.zeros(nTeams, dtype=np.int) + 
+                                 np.asarray(dataDict['nGames'], dtype=np.int))
+        stacked['snapshot'].append(np.zeros(nTeams, dtype=np.int) + i)
+    for key in ['pointsFor', 'pointsAgainst', 'wlp', 'nGames', 'snapshot']:
+        stacked[key] = np.concatenate(stacked[key])
+    stacked['teamId'] = registry.intern(stacked['teams'])
+    return stacked
+
+
+def fitPythagoreans(model, snapshots, staticParams=None, processes=None, 
+                    tol=1e-10, maxiter=200):
+    '''
+    Fits the Pythagorean *model* (e.g. Pythagenport) to many league 
+    snapshots in one call. *snapshots* is either a list of data 
+    dictionaries or a dictionary stacked by stackDataDicts. 
+    All snapshots are optimized simultaneously by a vectorized 
+    Levenberg-Marquardt iteration on the analytic gradient. If *processes* 
+    is given, the snapshots are split into that many chunks which are 
+    fitted in a process pool.
+    If *staticParams* is given, no optimization is performed.
+    
+    Returns a record array with one row per team and snapshot and the
+    fields snapshot, team, xopt, prediction and power.
+    '''
+    if not isinstance(snapshots, dict):
+        snapshots = stackDataDicts(snapshots)
+    snapshot = np.asarray(snapshots['snapshot'])
+    if processes is None or processes < 2:
+        return _fitStacked((model, snapshots, staticParams, tol, maxiter))
+    chunks = []
+    rows = []
+    for ids in np.array_split(np.unique(snapshot), processes):
+        rows.append(np.flatnonzero(np.in1d(snapshot, ids)))
+        chunks.append((model, _selectRows(snapshots, rows[-1]), staticParams, 
+                       tol, maxiter))
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_fitStacked, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    # restore the original row order
+    order = np.argsort(np.concatenate(rows), kind='mergesort')
+    return np.concatenate(results)[order].view(np.recarray)
+
+
+def _selectRows(stacked, rows):
+    selected = {'teams': [stacked['teams'][i] for i in rows]}
+    for key in ['pointsFor', 'pointsAgainst', 'wlp', 'nGames', 'snapshot',
+                'teamId']:
+        if key in stacked:
+            selected[key] = np.asarray(stacked[key])[rows]
+    return selected
+
+
+def _fitStacked(args):
+    model, stacked, staticParams, tol, maxiter = args
+    pooled = model(stacked)
+    pf, pa = pooled.pointsFor, pooled.pointsAgainst
+    snapshots, seg = np.unique(stacked['snapshot'], return_inverse=True)
+    nSnap = len(snapshots)
+    if staticParams is not None:
+        X = np.tile(np.double(staticParams), (nSnap, 1))
+    else:
+        X = np.tile(np.atleast_1d(np.double(pooled.guess)), (nSnap, 1))
+        with instrument.stage('pythagoreans.batch_fit'):
+            X = _levenbergMarquardt(pooled, X, seg, tol, maxiter)
+    params = X[seg].T
+    power = np.zeros_like(pf) + np.ravel(pooled.calculateExponent(pf, pa, 
+                                                                  params))
+    prediction = pooled.f(pf, pa, power)
+    result = np.zeros(len(pf), dtype=[('snapshot', np.int), 
+                                      ('team', object),
+                                      ('xopt', np.double, (X.shape[1],)),
+                                      ('prediction', np.double), 
+                                      ('power', np.double)])
+    result['snapshot'] = stacked['snapshot']
+    result['team'] = stacked['teams']
+    result['xopt'] = X[seg]
+    result['prediction'] = prediction
+    result['power'] = power
+    return result.view(np.recarray)
+
+
+def _levenbergMarquardt(pooled, X, seg, tol, maxiter):
+    # Every snapshot is an independent least-squares problem, so the normal
+    # equations are accumulated per snapshot with np.bincount and solved 
+    # as a stack of small (nParams x nParams) systems.
+    pf, pa, wlp = pooled.pointsFor, pooled.pointsAgainst, pooled.wlp
+    nSnap, nParams = X.shape
+    
+    def evaluate(X):
+        params = X[seg].T
+        x = np.ravel(np.zeros_like(pf) + pooled.calculateExponent(pf, pa, 
+                                                                  params))
+        r = wlp - pooled.f(pf, pa, x)
+        ssq = np.bincount(seg, r**2, minlength=nSnap)
+        return params, x, r, ssq
+    
+    params, x, r, ssq = evaluate(X)
+    damping = np.zeros(nSnap) + 1e-3
+    active = np.isfinite(ssq)
+    for it in xrange(maxiter):
+        if not active.any():
+            break
+        instrument.count('pythagoreans.batch_fit', 'iterations')
+        instrument.count('pythagoreans.batch_fit', 'snapshot_iterations', 
+                         int(active.sum()))
+        J = np.array(pooled.exponentGradient(pf, pa, params)) * \
+            pooled.dfdx(pf, pa, x)
+        JtJ = np.empty((nSnap, nParams, nParams))
+        Jtr = np.empty((nSnap, nParams))
+        for a in xrange(nParams):
+            Jtr[:, a] = np.bincount(seg, J[a]*r, minlength=nSnap)
+            for b in xrange(a, nParams):
+                JtJ[:, a, b] = JtJ[:, b, a] = np.bincount(seg, J[a]*J[b], 
+                                                          minlength=nSnap)
+        diagonal = np.diagonal(JtJ, axis1=1, axis2=2)
+        A = JtJ + (damping[:, np.newaxis, np.newaxis] * 
+                   (diagonal[:, :, np.newaxis] + 1e-12) * np.eye(nParams))
+        step = np.linalg.solve(A, Jtr[:, :, np.newaxis])[:, :, 0]
+        step[~active] = 0.
+        newParams, newX, newR, newSsq = evaluate(X + step)
+        accept = active & (newSsq <= ssq)
+        X[accept] += step[accept]
+        rows = accept[seg]
+        params = np.where(rows, newParams, params)
+        x = np.where(rows, newX, x)
+        r = np.where(rows, newR, r)
+        ssq = np.where(accept, newSsq, ssq)
+        damping = np.where(accept, damping / 10., damping * 10.)
+        converged = np.all(np.abs(step) <= tol * (np.abs(X) + tol), axis=1)
+        active &= ~converged & (damping < 1e16)
+    return X
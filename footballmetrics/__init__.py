@@ -0,0 +1,26 @@
+'''
+A package for statistical analysis of football data.
+
+The main classes are available from the package, e.g.::
+
+    from footballmetrics import FISB_Ranking, Pythagenport
+
+SciPy, urllib2 and multiprocessing are only imported once a solver, the
+fetcher or a process pool is used, so importing the package stays cheap.
+'''
+from drafttools import DraftValue
+from Pythagoreans import (Pythagorean, PythagoreanExpectation, Pythagenport,
+                          PythagenportFO, Pythagenpat, PythagoreanCache,
+                          PythagoreanCalibration, fitPythagoreans,
+                          stackDataDicts)
+from rankings import FISB_Ranking
+from seasonstore import SeasonStore, export_store
+from simulation import SeasonSimulator
+from teams import TeamRegistry
+
+
+__all__ = ['DraftValue', 'Pythagorean', 'PythagoreanExpectation',
+           'Pythagenport', 'PythagenportFO', 'Pythagenpat',
+           'PythagoreanCache', 'PythagoreanCalibration', 'fitPythagoreans',
+           'stackDataDicts', 'FISB_Ranking', 'SeasonStore', 'export_store',
+           'SeasonSimulator', 'TeamRegistry']
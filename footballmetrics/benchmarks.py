@@ -0,0 +1,255 @@
+'''
+Benchmarks of the hot paths of footballmetrics on synthetic seasons.
+
+Run ``python benchmarks.py --output results.json`` to time the Pythagorean
+fits, the FISB rankings, the standings rebuild and the database ingest at
+NFL, college and pooled 50-season scale, the draft trade package search
+and the import of the package. 
+The results are written as JSON, so that runs can be compared over time.
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+import drafttools
+import gamesdb
+import Pythagoreans
+import rankings
+import standings
+
+
+# number of seasons, teams, weeks and games per team and week
+SCALES = {'nfl': {'seasons': 1, 'teams': 32, 'weeks': 17},
+          'college': {'seasons': 1, 'teams': 130, 'weeks': 15},
+          'pooled': {'seasons': 50, 'teams': 32, 'weeks': 17}}
+
+MODELS = ['PythagoreanExpectation', 'Pythagenport', 'PythagenportFO',
+          'Pythagenpat']
+
+# trade package targets which no package of picks 1-224 hits exactly
+DRAFT_TARGETS = [1234.71, 777.3, 2222.2, 1.]
+
+IMPORTS = ['footballmetrics', 'footballmetrics.rankings', 
+           'footballmetrics.Pythagoreans', 'footballmetrics.fetchPFRdata',
+           'footballmetrics.runner']
+
+# modules which should only be loaded when they are used
+HEAVY_MODULES = ['scipy', 'urllib2', 'multiprocessing', 'html5lib']
+
+IMPORT_CODE = '''import sys, timeit
+start = timeit.default_timer()
+import %s
+print timeit.default_timer() - start
+print ' '.join(name for name in %r if name in sys.modules)'''
+
+
+def synthetic_season(year, n_teams, n_weeks, rng):
+    '''
+    Returns the games of a synthetic season as (year, week, home team,
+    away team, home score, away score) tuples. Every week the teams are
+    paired randomly; the scores depend on normally distributed team
+    strengths and a home field advantage of 3 points.
+    '''
+    strengths = rng.normal(0, 7, n_teams)
+    games = []
+    for week in xrange(1, n_weeks + 1):
+        pairs = rng.permutation(n_teams - n_teams % 2).reshape(-1, 2)
+        margins = (strengths[pairs[:, 0]] - strengths[pairs[:, 1]] + 3 +
+                   rng.normal(0, 13, len(pairs)))
+        base = rng.poisson(20, len(pairs))
+        home_scores = base + np.maximum(np.round(margins), 0).astype(int)
+        away_scores = base + np.maximum(-np.round(margins), 0).astype(int)
+        for (home, away), home_score, away_score in zip(pairs, home_scores,
+                                                        away_scores):
+            games.append((year, week, 'Team%03d' % home, 'Team%03d' % away,
+                          int(home_score), int(away_score)))
+    return games
+
+
+def synthetic_games(scale, first_year=1970, seed=0):
+    '''Returns the games of all seasons of the given *scale*.'''
+    rng = np.random.RandomState(seed)
+    config = SCALES[scale]
+    games = []
+    for year in xrange(first_year, first_year + config['seasons']):
+        games += synthetic_season(year, config['teams'], config['weeks'],
+                                  rng)
+    return games
+
+
+def time_call(func, repeat=3):
+    '''
+    Calls *func* *repeat* times and returns the best and the median wall
+    clock time in seconds.
+    '''
+    times = []
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        func()
+        times.append(timeit.default_timer() - start)
+    return {'best': min(times), 'median': float(np.median(times)),
+            'repeat': repeat}
+
+
+def import_time(module, repeat=3):
+    '''
+    Times the import of *module* in *repeat* fresh interpreters. Returns
+    the best and the median time in seconds and the heavy modules 
+    (see HEAVY_MODULES) loaded by the import.
+    '''
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + filter(None, [env.get('PYTHONPATH')]))
+    times = []
+    for i in xrange(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_CODE % (module, HEAVY_MODULES)],
+            env=env).splitlines()
+        times.append(float(output[0]))
+        heavy = output[1].split() if len(output) > 1 else []
+    return {'best': min(times), 'median': float(np.median(times)),
+            'repeat': repeat, 'heavy': heavy}
+
+
+def pythagorean_data(con, years):
+    '''
+    Returns the final standings of all *years* as a single data
+    dictionary for the classes of Pythagoreans.py.
+    '''
+    tables = []
+    for year in years:
+        table = standings.season_standings(con, year)
+        tables.append(table[table.Week == table.Week.max()])
+    table = np.concatenate(tables).view(np.recarray)
+    nGames = table.Win + table.Loss + table.Tie
+    return {'teams': list(table.Team), 'pointsFor': table.PointsFor,
+            'pointsAgainst': table.PointsAgainst,
+            'wlp': (table.Win + 0.5 * table.Tie) / nGames.astype(float),
+            'nGames': nGames}
+
+
+def benchmark_scale(scale, repeat=3, iterations=100):
+    '''
+    Runs all benchmarks on synthetic data of the given *scale* and
+    returns a dictionary of the timings by benchmark name.
+    '''
+    games = synthetic_games(scale)
+    years = sorted(set(game[0] for game in games))
+    results = {}
+
+    def ingest():
+        con = gamesdb.connect(':memory:')
+        gamesdb.insert_games(con, games)
+        con.close()
+    results['ingest'] = time_call(ingest, repeat)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmpdir, 'games.db')
+        con = gamesdb.connect(db_path)
+        gamesdb.insert_games(con, games)
+        results['standings'] = time_call(
+            lambda: standings.store_standings(con, years), repeat)
+        data = pythagorean_data(con, years)
+        con.close()
+        for model in MODELS:
+            results['pythagorean_%s' % model] = time_call(
+                lambda: getattr(Pythagoreans, model)(data)
+                .calculatePythagorean(), repeat)
+
+        def rank(**kwargs):
+            for year in years:
+                ranking = rankings.FISB_Ranking(year, SCALES[scale]['weeks'])
+                ranking.load_data(db_path)
+                ranking.calculate_ranking(**kwargs)
+        results['ranking'] = time_call(rank, repeat)
+        results['ranking_bootstrap'] = time_call(
+            lambda: rank(bootstrapping=True, iterations=iterations, seed=0),
+            repeat)
+    finally:
+        shutil.rmtree(tmpdir)
+    return {'games': len(games), 'seasons': len(years), 'results': results}
+
+
+def benchmark_draft(repeat=3):
+    '''
+    Times the search of the 10 best trade packages of 2 to 4 picks over a
+    full draft class for every target value of DRAFT_TARGETS. Returns a
+    dictionary of the timings by target, which is empty if the draft 
+    value chart is not found.
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db_path = os.path.join(root, 'draft_value_chart.db')
+    if not os.path.isfile(db_path):
+        return {}
+    draft = drafttools.DraftValue(in_memory=True)
+    draft.set_database_path(db_path)
+    draft.load_chart()
+    return dict(('packages_%g' % target, time_call(
+        lambda: draft.find_packages(range(1, 225), target_value=target, 
+                                    top_k=10), repeat))
+                for target in DRAFT_TARGETS)
+
+
+def run_benchmarks(scales=None, repeat=3, iterations=100, output=None,
+                   imports=True):
+    '''
+    Runs the benchmarks of all *scales* (by default all of SCALES), the
+    draft trade package search and, if *imports* = True, the import times
+    of IMPORTS. Returns the results
+    together with information about the environment.
+    If *output* is given, the results are also written to this JSON file.
+    '''
+    report = {'timestamp': datetime.datetime.utcnow().isoformat(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'scales': {}, 'imports': {}}
+    for scale in scales or sorted(SCALES):
+        report['scales'][scale] = benchmark_scale(scale, repeat, iterations)
+    report['draft'] = benchmark_draft(repeat)
+    if imports:
+        for module in IMPORTS:
+            report['imports'][module] = import_time(module, repeat)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the footballmetrics '
+                                     'benchmarks.')
+    parser.add_argument('--scale', action='append', choices=sorted(SCALES),
+                        help='scale to run, may be given several times '
+                        '(default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=100,
+                        help='bootstrap iterations')
+    parser.add_argument('--output', help='JSON file for the results')
+    args = parser.parse_args(argv)
+    report = run_benchmarks(args.scale, args.repeat, args.iterations,
+                            args.output)
+    for scale in sorted(report['scales']):
+        for name, timing in sorted(
+                report['scales'][scale]['results'].iteritems()):
+            print '%-8s %-28s %10.4f s' % (scale, name, timing['best'])
+    for name, timing in sorted(report['draft'].iteritems()):
+        print '%-8s %-28s %10.4f s' % ('draft', name, timing['best'])
+    for module, timing in sorted(report['imports'].iteritems()):
+        print '%-8s %-28s %10.4f s %s' % ('import', module, timing['best'],
+                                          ' '.join(timing['heavy']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
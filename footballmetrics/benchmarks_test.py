@@ -0,0 +1,48 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmarks
+
+
+class BenchmarksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testSyntheticSeason(self):
+        '''Testing the size of the synthetic NFL season...'''
+        games = benchmarks.synthetic_games('nfl')
+        self.assertEqual(len(games), 16 * 17)
+        self.assertEqual(len(set(game[2] for game in games) |
+                             set(game[3] for game in games)), 32)
+
+    def testJSONReport(self):
+        '''Testing that the benchmark results are written as JSON...'''
+        output = os.path.join(self.tmpdir, 'results.json')
+        benchmarks.run_benchmarks(['nfl'], repeat=1, iterations=10,
+                                  output=output, imports=False)
+        with open(output) as f:
+            report = json.load(f)
+        results = report['scales']['nfl']['results']
+        names = ['ingest', 'standings', 'ranking', 'ranking_bootstrap']
+        for name in names + ['pythagorean_%s' % model 
+                             for model in benchmarks.MODELS]:
+            self.assertTrue(results[name]['best'] >= 0)
+        self.assertEqual(len(report['draft']), 
+                         len(benchmarks.DRAFT_TARGETS))
+
+    def testLightImport(self):
+        '''Testing that importing the package loads no heavy modules...'''
+        for module in benchmarks.IMPORTS:
+            timing = benchmarks.import_time(module, repeat=1)
+            self.assertEqual(timing['heavy'], [])
+            self.assertTrue(timing['best'] > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,26 @@
+import heapq
 import os
 
 import sqlite3
+import numpy as np
+
+
+# draft value charts loaded into memory, shared by all DraftValue instances
+_charts = {}
+
+
+def _combinations(n, size):
+    # all combinations of *size* of range(n) as rows of an array, in 
+    # lexicographic order
+    combos = np.zeros((1, 0), dtype=int)
+    for i in xrange(size):
+        first = combos[:, -1] + 1 if i else np.zeros(1, dtype=int)
+        counts = np.maximum(n - first, 0)
+        rows = np.repeat(np.arange(len(combos)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - 
+                                                      counts, counts)
+        combos = np.column_stack((combos[rows], first[rows] + offsets))
+    return combos
 
 
 class DraftValue:
@@ -8,12 +28,18 @@ class DraftValue:
     This class uses the draft value chart to calculate the value of a pick
     at a certain position or to calculate the corresponding draft position
     of a given value.
+    If *in_memory* = True, the chart is loaded once into sorted arrays and
+    all lookups are answered from memory. Both lookups then also accept
+    arrays of positions or values.
     '''
-    def __init__(self):
+    def __init__(self, in_memory=False):
         self.db_path = '../draft_value_chart.db'
+        self.in_memory = in_memory
     
     def get_value(self, position):
         '''Returns the value of a pick at the given *position*.'''
+        if self.in_memory:
+            return self.__lookup_values(position)
         if not os.path.isfile(self.db_path):
             raise IOError('Database not found. Please use set_database_path.')
         con = sqlite3.connect(self.db_path)
@@ -28,14 +54,19 @@ class DraftValue:
         return value
 
     def get_position(self,value):
-        '''Returns the draft pick for a given *value*.'''
+        '''
+        Returns the draft pick for a given *value*, i.e. the earliest pick
+        whose value does not exceed *value*.
+        '''
+        if self.in_memory:
+            return self.__lookup_positions(value)
         con = sqlite3.connect(self.db_path)
         with con:
             cur = con.cursor()
             try:
-                cur.execute('select position from draft_value where value<=%f'
-                             % value)
-            except TypeError:
+                cur.execute('select position from draft_value where value<=? '
+                            'order by position limit 1', (float(value),))
+            except (TypeError, ValueError):
                 raise TypeError('Value needs to be a number.')
             position = cur.fetchone()[0]
         return position
@@ -50,8 +81,156 @@ class DraftValue:
         else:
             raise IOError('File not found.')
 
+    def find_packages(self, picks, target_position=None, target_value=None,
+                      min_picks=2, max_picks=4, top_k=5):
+        '''
+        Searches the combinations of *min_picks* to *max_picks* of the given
+        *picks* whose total value best matches the value of the pick at 
+        *target_position* (or *target_value*). 
+        Returns the *top_k* packages as (picks, total value, gap) tuples, 
+        sorted by the absolute gap to the target value.
+        The search meets in the middle: every package is split into a left
+        and a right half of at most two picks (three for packages of five
+        or six picks), and every left half walks the right halves, sorted
+        by their totals, away from its missing value in both directions. 
+        These walks are merged by gap, so only the packages closer to the
+        target than the k-th best one are ever looked at.
+        '''
+        if target_value is None:
+            if target_position is None:
+                raise TypeError('Either target_position or target_value '
+                                'needs to be given.')
+            target_value = self.__lookup_values(target_position)
+        picks = np.asarray(picks, dtype=int)
+        order = np.argsort(-self.__lookup_values(picks), kind='mergesort')
+        picks = picks[order]
+        values = np.asarray(self.__lookup_values(picks), dtype=float)
+        n = len(picks)
+        halves = {}
+        
+        def half(size):
+            # combinations of *size* picks sorted by their total value
+            if size not in halves:
+                combos = _combinations(n, size)
+                totals = np.sum(values[combos], axis=1)
+                order = np.argsort(totals, kind='mergesort')
+                halves[size] = combos[order], totals[order]
+            return halves[size]
+        
+        # walks of all package sizes as columns of their size, left half,
+        # first position and step and of the gap and the validity of their
+        # first package
+        columns = [[] for i in xrange(6)]
+        for size in xrange(max(min_picks, 1), min(max_picks, n) + 1):
+            lefts, left_totals = half(size // 2)
+            rights, right_totals = half(size - size // 2)
+            middle = np.searchsorted(right_totals, target_value - left_totals)
+            # the picks of a left half precede those of its right half, so
+            # that every package is built exactly once
+            possible = size == 1 or (lefts[:, -1] < n - (size - size // 2))
+            for position, step in [(middle - 1, -1), (middle, 1)]:
+                index = np.flatnonzero(possible & (position >= 0) & 
+                                       (position < len(right_totals)))
+                position = position[index]
+                gaps = np.abs(left_totals[index] + right_totals[position] - 
+                              target_value)
+                if size == 1:
+                    first_valid = np.ones(len(index), dtype=bool)
+                else:
+                    first_valid = lefts[index, -1] < rights[position, 0]
+                for column, data in zip(columns, [
+                        np.repeat(size, len(index)), index, position,
+                        np.repeat(step, len(index)), gaps, first_valid]):
+                    column.append(data)
+        if not columns[0]:
+            return []
+        columns = [np.concatenate(column) for column in columns]
+        gaps, first_valid = columns[4], columns[5]
+        # the k best first packages bound the gap of the k-th best package,
+        # walks starting beyond it are never needed
+        keep = np.ones(len(gaps), dtype=bool)
+        if 0 < top_k <= np.count_nonzero(first_valid):
+            keep = gaps <= np.partition(gaps[first_valid], top_k-1)[top_k-1]
+        order = np.flatnonzero(keep)[np.argsort(gaps[keep], kind='mergesort')]
+        walks = zip(*[column[order].tolist() for column in columns[:4]])
+        first_gaps = gaps[order].tolist()
+        heap = []  # (gap, walk, position) of the next package of every walk
+        packages = []
+        started = 0
+        while len(packages) < top_k:
+            if started < len(walks) and (not heap or 
+                                         first_gaps[started] <= heap[0][0]):
+                heapq.heappush(heap, (first_gaps[started], started, 
+                                      walks[started][2]))
+                started += 1
+                continue
+            if not heap:
+                break
+            gap, walk, position = heapq.heappop(heap)
+            size, left, first, step = walks[walk]
+            lefts, left_totals = half(size // 2)
+            rights, right_totals = half(size - size // 2)
+            total = float(left_totals[left] + right_totals[position])
+            if size == 1 or lefts[left, -1] < rights[position, 0]:
+                package = np.concatenate((lefts[left], rights[position]))
+                packages.append((tuple(picks[package].tolist()), total, gap))
+            position += step
+            if 0 <= position < len(right_totals):
+                heapq.heappush(heap, (abs(left_totals[left] + 
+                                          right_totals[position] - 
+                                          target_value), walk, position))
+        return packages
+    
+    def load_chart(self):
+        '''
+        Returns the draft value chart as arrays of the positions and values,
+        sorted by position. The chart is read from the database only once
+        per path.
+        '''
+        path = os.path.abspath(self.db_path)
+        if path not in _charts:
+            if not os.path.isfile(path):
+                raise IOError('Database not found. '
+                              'Please use set_database_path.')
+            con = sqlite3.connect(path)
+            with con:
+                chart = con.execute('select position, value from draft_value '
+                                    'order by position').fetchall()
+            con.close()
+            positions = np.array([row[0] for row in chart], dtype=int)
+            values = np.array([row[1] for row in chart], dtype=float)
+            # the earliest pick worth at most v is the first one where the
+            # running minimum of the values drops to v
+            _charts[path] = (positions, values,
+                             np.minimum.accumulate(values))
+        return _charts[path]
+
+    def __lookup_values(self, position):
+        positions, values, running_min = self.load_chart()
+        position = np.asarray(position)
+        if position.dtype.kind not in 'iu':
+            raise TypeError('Position needs to be an integer number.')
+        index = np.clip(np.searchsorted(positions, position), 0,
+                        len(positions)-1)
+        if np.any(positions[index] != position):
+            raise ValueError('Position not found in draft value chart.')
+        return values[index] if position.ndim else values[index].item()
+
+    def __lookup_positions(self, value):
+        positions, values, running_min = self.load_chart()
+        try:
+            value = np.asarray(value, dtype=float)
+        except ValueError:
+            raise TypeError('Value needs to be a number.')
+        # running_min is non-increasing, search it in ascending order
+        index = len(running_min) - np.searchsorted(running_min[::-1], value,
+                                                   side='right')
+        if np.any(index >= len(positions)):
+            raise ValueError('Value is below the draft value chart.')
+        return positions[index] if value.ndim else positions[index].item()
+
 
 if __name__ == '__main__':
     d = DraftValue()
     print 2*d.get_value(32) + d.get_value(38) + d.get_value(6)
-    print d.get_position(294)
\ No newline at end of file
+    print d.get_position(294)
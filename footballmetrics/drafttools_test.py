@@ -0,0 +1,87 @@
+import itertools
+import os
+import unittest
+
+import numpy as np
+
+import drafttools
+
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                       'draft_value_chart.db')
+
+
+class DraftValueTest(unittest.TestCase):
+    def setUp(self):
+        self.sql = drafttools.DraftValue()
+        self.sql.set_database_path(DB_PATH)
+        self.memory = drafttools.DraftValue(in_memory=True)
+        self.memory.set_database_path(DB_PATH)
+
+    def testValues(self):
+        '''Testing in-memory values against the database...'''
+        positions = np.arange(1, 225)
+        values = self.memory.get_value(positions)
+        for position, value in zip(positions, values):
+            self.assertEqual(value, self.sql.get_value(int(position)))
+        self.assertEqual(self.memory.get_value(6), 1600.)
+
+    def testPositions(self):
+        '''Testing in-memory positions against the database...'''
+        values = [3000., 2999., 1600., 1599.5, 294., 100., 2.]
+        positions = self.memory.get_position(values)
+        for value, position in zip(values, positions):
+            self.assertEqual(position, self.sql.get_position(value))
+        self.assertEqual(self.memory.get_position(1600), 6)
+
+    def testBadInput(self):
+        '''Testing in-memory lookups with bad input...'''
+        self.assertRaises(TypeError, self.memory.get_value, 1.5)
+        self.assertRaises(ValueError, self.memory.get_value, 225)
+        self.assertRaises(TypeError, self.memory.get_position, 'bla')
+        self.assertRaises(ValueError, self.memory.get_position, -1.)
+
+    def testFindPackages(self):
+        '''Testing trade packages against all combinations...'''
+        picks = [20, 52, 84, 116, 148, 180, 212, 40, 70]
+        packages = self.memory.find_packages(picks, target_position=6,
+                                             top_k=5)
+        gaps = sorted(abs(sum(self.sql.get_value(p) for p in c) - 1600.)
+                      for n in (2, 3, 4)
+                      for c in itertools.combinations(picks, n))
+        self.assertEqual(len(packages), 5)
+        self.assertEqual(sorted(packages[0][0]), [20, 40, 70, 212])
+        for (package, total, gap), expected in zip(packages, gaps):
+            self.assertAlmostEqual(gap, expected)
+            self.assertAlmostEqual(total, sum(self.sql.get_value(p)
+                                              for p in package))
+
+    def testFindPackagesDraftClass(self):
+        '''Testing trade package search over a draft class...'''
+        picks = range(7, 225, 7)
+        values = dict((p, self.sql.get_value(p)) for p in picks)
+        packages = self.memory.find_packages(picks, target_value=1234.71,
+                                             top_k=10)
+        gaps = sorted(abs(sum(values[p] for p in c) - 1234.71)
+                      for n in (2, 3, 4)
+                      for c in itertools.combinations(picks, n))
+        self.assertEqual(len(packages), 10)
+        self.assertEqual(len(set(package for package, total, gap 
+                                 in packages)), 10)
+        for (package, total, gap), expected in zip(packages, gaps):
+            self.assertAlmostEqual(gap, expected)
+            self.assertAlmostEqual(total, sum(values[p] for p in package))
+        self.assertRaises(TypeError, self.memory.find_packages, [1, 2])
+
+    def testFindPackagesSizes(self):
+        '''Testing trade package search with package sizes...'''
+        packages = self.memory.find_packages(range(1, 225), target_value=1.,
+                                             min_picks=4, top_k=2)
+        self.assertEqual([package for package, total, gap in packages],
+                         [(221, 222, 223, 224), (220, 222, 223, 224)])
+        packages = self.memory.find_packages([1, 2], target_value=1.,
+                                             min_picks=3)
+        self.assertEqual(packages, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,163 +1,310 @@
-import urllib2
-import html5lib
-import sqlite3 as sql
+import codecs
+import collections
+import hashlib
+import HTMLParser
+import json
+import os
+import urlparse
 
+import gamesdb
+import standings
 
-class fetchGames:
-    def __init__(self, years):
-        self.years = list(years)
-        
-    def getSeasonGames(self):
-        for year in self.years:
-            print 'Processing %d season.' % (year)
-            url = 'http://www.pro-football-reference.com/years/%s/games.htm' % (year)
-            parser = html5lib.HTMLParser(tree=html5lib.treebuilders.getTreeBuilder('beautifulsoup'))
-            tree = parser.parse(urllib2.urlopen(url).read())
-            data = tree.findAll('tr')
-            data = data[1:]
-            
-            games = []
-            for i in data:
-                decoded = str(i).decode('utf-8')
-                s = decoded.strip().split('\n')
-                s = [x.strip() for x in s]
-                try:
-                    game = []
-                    week = s[1].split('</td')[0].split('">')[1].encode()
-                    if week == 'Wildcard':
-                        week = 18
-                    elif week == 'Division':
-                        week = 19
-                    elif week == 'ConfChamp':
-                        week = 20
-                    elif week == 'SuperBowl':
-                        week = 21
-                    home_team, away_team = self.getTeamName(s)
-                    home_score, away_score = self.getScore(s)
-                    game += [int(year), int(week), home_team, away_team, int(home_score), int(away_score)]
-                    games += [game]
-                except:
-                    pass
+
+GAMES_URL = 'http://www.pro-football-reference.com/years/%d/games.htm'
+
+Game = collections.namedtuple('Game', ['year', 'week', 'home_team', 
+                                       'away_team', 'home_score', 
+                                       'away_score'])
+
+
+class pageCache:
+    '''
+    On-disk HTTP cache keyed by URL. Every page is stored with its ETag and
+    Last-Modified headers, so that it can be revalidated with a 
+    conditional request instead of being downloaded again.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
             
-            print 'Writing data to database.'
-            con = sql.connect('nfl_games.db')
-            cur = con.cursor()
-            cur.execute('CREATE TABLE IF NOT EXISTS games (Id INTEGER PRIMARY KEY AUTOINCREMENT, Year INTEGER, Week INTEGER, HomeTeam TEXT, AwayTeam TEXT, HomeScore INTEGER, AwayScore INTEGER)')
+    def __getPaths(self, url):
+        key = hashlib.sha1(url).hexdigest()
+        path = os.path.join(self.directory, key)
+        return path + '.htm', path + '.json'
+        
+    def get(self, url):
+        '''Returns the cached page and its headers or (None, None).'''
+        bodyPath, metaPath = self.__getPaths(url)
+        if not (os.path.isfile(bodyPath) and os.path.isfile(metaPath)):
+            return None, None
+        with open(metaPath) as f:
+            meta = json.load(f)
+        with open(bodyPath, 'rb') as f:
+            body = f.read()
+        return body, meta
+    
+    def put(self, url, body, headers):
+        '''Stores *body* together with the validators found in *headers*.'''
+        bodyPath, metaPath = self.__getPaths(url)
+        meta = {'url': url, 
+                'ETag': headers.get('ETag'),
+                'Last-Modified': headers.get('Last-Modified')}
+        with open(bodyPath, 'wb') as f:
+            f.write(body)
+        with open(metaPath, 'w') as f:
+            json.dump(meta, f)
             
-            for game in games:
-                cur.execute("INSERT INTO games VALUES(null, %d, %d,'%s','%s','%d','%d')" % tuple(game))
             
-            con.commit()
-            con.close()
-            print 'Done.'
-    
+class pageFetcher:
+    '''
+    Downloads pages concurrently through a bounded pool of *workers* 
+    threads. If *cacheDir* is given, pages are cached on disk and only
+    downloaded again, if the server reports a change. If *replayDir* is 
+    given, no network access happens at all and the pages are read from 
+    saved HTML files, which are located by the path of the URL 
+    (e.g. <replayDir>/years/2011/games.htm).
+    '''
+    def __init__(self, cacheDir=None, replayDir=None, workers=4, timeout=60):
+        self.cache = pageCache(cacheDir) if cacheDir is not None else None
+        self.replayDir = replayDir
+        self.workers = workers
+        self.timeout = timeout
         
-    def getTeamName(self, data_string):
-        sign = data_string[6].split('</td')[0].split('>')[1].encode()
-    
-        t = lambda st: st.split('</a')[0].split('.htm">')[1].encode()
-    
-        if sign == '':
-            home_team = t(data_string[5])
-            away_team = t(data_string[7])
-        elif sign == '@':
-            home_team = t(data_string[7])
-            away_team = t(data_string[5])
-        else:
-            #print 'ERROR when parsing for home and away teams.'
-            #print 'Sign = %s' % sign
-            home_team = away_team = ''
+    def fetch(self, url):
+        '''Returns the content of the page at *url*.'''
+        if self.replayDir is not None:
+            path = urlparse.urlparse(url).path.lstrip('/')
+            with open(os.path.join(self.replayDir, path), 'rb') as f:
+                return f.read()
+        import urllib2
+        request = urllib2.Request(url)
+        body = meta = None
+        if self.cache is not None:
+            body, meta = self.cache.get(url)
+        if body is not None:
+            if meta.get('ETag'):
+                request.add_header('If-None-Match', meta['ETag'])
+            if meta.get('Last-Modified'):
+                request.add_header('If-Modified-Since', meta['Last-Modified'])
+        try:
+            response = urllib2.urlopen(request, timeout=self.timeout)
+        except urllib2.HTTPError, e:
+            if e.code == 304 and body is not None:
+                return body
+            raise
+        content = response.read()
+        if self.cache is not None:
+            self.cache.put(url, content, response.info())
+        return content
     
-        return home_team, away_team
+    def fetchAll(self, urls):
+        '''Returns the contents of all *urls* in the given order.'''
+        urls = list(urls)
+        if self.workers < 2 or len(urls) < 2:
+            return map(self.fetch, urls)
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(self.workers, len(urls)))
+        try:
+            return pool.map(self.fetch, urls)
+        finally:
+            pool.close()
+            pool.join()
 
 
-    def getScore(self, data_string):
-        sign = data_string[6].split('</td')[0].split('>')[1].encode()
-    
-        t = lambda st: st.split('</td')[0].split('"right">')[1].encode()
-    
-        sc1 = t(data_string[8])
-        sc2 = t(data_string[9])
-        if '<strong>' in sc1:
-            sc1 = sc1.split('</st')[0].split('ong>')[1].encode()
-        elif '<strong>' in sc2:
-            sc2 = sc2.split('</st')[0].split('ong>')[1].encode()
+class gamesTableParser(HTMLParser.HTMLParser):
+    '''
+    Event-driven parser for the games table of a PFR season page. 
+    The page is fed in chunks and only the row currently being read is 
+    kept in memory. Columns are located by their data-stat attribute 
+    or, for older pages, by their header name. Completed games are
+    yielded as Game records by ``parse``. Rows that are not games are
+    recorded in *self.rejected* as (line number, reason) tuples.
+    '''
+    # header names of older pages, the location column ('@') has no name
+    # and follows the winner column
+    HEADERS = {'Week': 'week_num', 'Winner/tie': 'winner', 
+               'Loser/tie': 'loser', 'PtsW': 'pts_win', 'PtsL': 'pts_lose'}
+    PLAYOFF_WEEKS = {'WildCard': 18, 'Wildcard': 18, 'Division': 19, 
+                     'ConfChamp': 20, 'SuperBowl': 21}
     
-        if sign == '':
-            home_score = sc1
-            away_score = sc2
-        elif sign == '@':
-            home_score = sc2
-            away_score = sc1
-        else:
-            #print 'ERROR when parsing for home and away scores.'
-            home_score = away_score = ''
-    
-        return home_score, away_score
-    
-    
-class fetchStandings:
-    def __init__(self, years):
-        self.years = years
-
-        
-    def getStandings(self):
-        con = sql.connect('nfl_games.db')
-        cur = con.cursor()
+    def __init__(self, year, tableId='games'):
+        HTMLParser.HTMLParser.__init__(self)
+        self.year = int(year)
+        self.tableId = tableId
+        self.rejected = []
+        self.columns = None
+        self.__games = []
+        self.__depth = 0
+        self.__row = None
+        self.__cell = None
         
-        cur.execute('drop table if exists standings')
-        cur.execute('create table standings(Id integer primary key autoincrement, Year int, Week int, Team text, Win int, Loss int, Tie int, PointFor int, PointsAgainst int)')
-            
-        for year in self.years:
-            print 'Processing %d season.' % year
-            t = []
-            
-            cur.execute('select HomeTeam, HomeScore from games where year=%d and week=1' % year)
-            home = cur.fetchall()
+    def parse(self, page, chunkSize=65536):
+        '''Yields the games of *page*, a string or a file-like object.'''
+        if isinstance(page, basestring):
+            chunks = (page[i:i+chunkSize] 
+                      for i in xrange(0, len(page), chunkSize))
+        else:
+            chunks = iter(lambda: page.read(chunkSize), '')
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        for chunk in chunks:
+            if not isinstance(chunk, unicode):
+                chunk = decoder.decode(chunk)
+            self.feed(chunk)
+            for game in self.__popGames():
+                yield game
+        self.close()
+        for game in self.__popGames():
+            yield game
             
-            cur.execute('select AwayTeam, AwayScore from games where year=%d and week=1' % year)
-            away = cur.fetchall()
+    def __popGames(self):
+        games, self.__games = self.__games, []
+        return games
+        
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self.__depth or self.tableId is None or \
+               dict(attrs).get('id') == self.tableId:
+                self.__depth += 1
+        elif not self.__depth:
+            return
+        elif tag == 'tr':
+            self.__endRow()
+            self.__row = []
+        elif tag in ('td', 'th') and self.__row is not None:
+            self.__endCell()
+            attrs = dict(attrs)
+            self.__cell = [tag, attrs.get('data-stat'), 
+                           int(attrs.get('colspan') or 1), []]
             
-            for h in home:
-                t.append(h[0].encode())
+    def handle_endtag(self, tag):
+        if not self.__depth:
+            return
+        if tag == 'table':
+            self.__endRow()
+            self.__depth -= 1
+        elif tag == 'tr':
+            self.__endRow()
+        elif tag in ('td', 'th'):
+            self.__endCell()
             
-            for a in away:
-                t.append(a[0].encode())
+    def handle_data(self, data):
+        if self.__cell is not None:
+            self.__cell[3].append(data)
             
-            teams = dict.fromkeys(t)
-            for t in teams.iterkeys():
-                teams[t] = [0,0,0,0,0] # win, loss, tie, points for, points against
+    def handle_entityref(self, name):
+        self.handle_data(self.unescape('&%s;' % name))
+        
+    def handle_charref(self, name):
+        self.handle_data(self.unescape('&#%s;' % name))
+        
+    def __endCell(self):
+        if self.__cell is not None:
+            tag, stat, span, text = self.__cell
+            self.__row.append((tag, stat, ''.join(text).strip()))
+            self.__row += [(tag, None, '')] * (span - 1)
+            self.__cell = None
             
-            cur.execute('select distinct week from games where year=%d' % year)
-            weeks = [int(w[0]) for w in cur.fetchall()]
+    def __endRow(self):
+        if self.__row is None:
+            return
+        self.__endCell()
+        row, self.__row = self.__row, None
+        if row and all(tag == 'th' for tag, stat, text in row):
+            if self.columns is None or row[0][2] == 'Week':
+                self.__readHeader(row)
+            return
+        try:
+            self.__games.append(self.__readGame(row))
+        except (KeyError, IndexError, ValueError), e:
+            self.rejected.append((self.getpos()[0], str(e)))
             
-            for w in weeks:
-                cur.execute('select * from games where year=%d and week=%d' % (year,w))
-                result = cur.fetchall()
-                for r in result:
-                    # save points for and points againts for home team and away team
-                    pts_home = [r[-2], r[-1]]
-                    pts_away = [r[-1], r[-2]]
-                    h = r[3].encode() # home team
-                    a = r[4].encode() # away team
-                    
-                    if pts_home[0] > pts_home[1]:
-                        teams[h] = [teams[h][0]+1, teams[h][1], teams[h][2], teams[h][3]+pts_home[0], teams[h][4]+pts_home[1]]
-                    elif pts_home[0] < pts_home[1]:
-                        teams[h] = [teams[h][0], teams[h][1]+1, teams[h][2], teams[h][3]+pts_home[0], teams[h][4]+pts_home[1]]
-                    else:
-                        teams[h] = [teams[h][0], teams[h][1], teams[h][2]+1, teams[h][3]+pts_home[0], teams[h][4]+pts_home[1]]
-                    
-                    if pts_away[0] > pts_away[1]:
-                        teams[a] = [teams[a][0]+1, teams[a][1], teams[a][2], teams[a][3]+pts_away[0], teams[a][4]+pts_away[1]]
-                    elif pts_away[0] < pts_away[1]:
-                        teams[a] = [teams[a][0], teams[a][1]+1, teams[a][2], teams[a][3]+pts_away[0], teams[a][4]+pts_away[1]]
-                    else:
-                        teams[a] = [teams[a][0], teams[a][1], teams[a][2]+1, teams[a][3]+pts_away[0], teams[a][4]+pts_away[1]]
+    def __readHeader(self, row):
+        columns = {}
+        names = [text for tag, stat, text in row]
+        for i, (tag, stat, text) in enumerate(row):
+            if stat is not None:
+                columns[stat] = i
+            elif text in self.HEADERS:
+                columns[self.HEADERS[text]] = i
+            elif text == 'Pts':
+                columns['pts_lose' if 'pts_win' in columns 
+                        else 'pts_win'] = i
+        if 'winner' in columns and 'game_location' not in columns and \
+           names[columns['winner']+1] == '':
+            columns['game_location'] = columns['winner'] + 1
+        self.columns = columns
+        
+    def __readGame(self, row):
+        if self.columns is None:
+            raise KeyError('row before table header')
+        # prefer the data-stat attributes of the row itself
+        cells = dict((stat, text) for tag, stat, text in row if stat)
+        get = lambda column: cells[column] if column in cells else \
+            row[self.columns[column]][2]
+        week = get('week_num')
+        week = int(self.PLAYOFF_WEEKS.get(week, week))
+        winner, loser = get('winner'), get('loser')
+        location = get('game_location')
+        ptsWin, ptsLose = get('pts_win'), get('pts_lose')
+        if not (winner and loser):
+            raise ValueError('missing team name')
+        if not (ptsWin and ptsLose):
+            raise ValueError('game without score: %s - %s' % (winner, loser))
+        if location == '':
+            return Game(self.year, week, winner, loser, int(ptsWin), 
+                        int(ptsLose))
+        elif location == '@':
+            return Game(self.year, week, loser, winner, int(ptsLose), 
+                        int(ptsWin))
+        raise ValueError('neutral site game: %s - %s' % (winner, loser))
+
+
+class fetchGames:
+    def __init__(self, years, cacheDir=None, replayDir=None, workers=4,
+                 dbPath='nfl_games.db'):
+        self.years = list(years)
+        self.fetcher = pageFetcher(cacheDir, replayDir, workers)
+        self.dbPath = dbPath
+        self.rejected = {}
+        
+    def getSeasonGames(self):
+        print 'Downloading %d seasons.' % len(self.years)
+        pages = self.fetcher.fetchAll([GAMES_URL % year 
+                                       for year in self.years])
+        games = []
+        for year, page in zip(self.years, pages):
+            print 'Processing %d season.' % (year)
+            games += self.parseSeasonGames(year, page)
+            if self.rejected[year]:
+                print 'Rejected %d rows.' % len(self.rejected[year])
             
-                for t in teams.iterkeys():
-                    cur.execute('insert into standings values(null, %d, %d, "%s", %d, %d, %d,  %d, %d)' % (year, w,t,teams[t][0], teams[t][1], teams[t][2], teams[t][3], teams[t][4]))
-                
-        con.commit()
+        print 'Writing data to database.'
+        con = gamesdb.connect(self.dbPath)
+        gamesdb.insert_games(con, games)
+        con.close()
+        print 'Done.'
         
-        con.close()
\ No newline at end of file
+    def parseSeasonGames(self, year, page):
+        '''
+        Yields the games of the *year* season found in *page* (a string or
+        a file-like object). Rows that could not be parsed are reported 
+        in *self.rejected[year]*.
+        '''
+        parser = gamesTableParser(year)
+        self.rejected[year] = parser.rejected
+        for game in parser.parse(page):
+            yield game
+    
+    
+class fetchStandings:
+    def __init__(self, years, dbPath='nfl_games.db'):
+        self.years = years
+        self.dbPath = dbPath
+        
+    def getStandings(self):
+        con = gamesdb.connect(self.dbPath)
+        con.execute('drop table if exists standings')
+        print 'Processing %d seasons.' % len(self.years)
+        standings.store_standings(con, self.years)
+        con.close()
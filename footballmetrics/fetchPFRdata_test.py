@@ -0,0 +1,219 @@
+import os
+import shutil
+import sqlite3
+import StringIO
+import tempfile
+import time
+import unittest
+import urllib2
+
+import fetchPFRdata
+
+
+# games table as found on the 2011 season page
+OLD_PAGE = '''<html><body>
+<table class="sortable stats_table" id="games">
+<thead>
+<tr class="">
+<th align="right" class="ranker">Week</th>
+<th align="left">Day</th>
+<th align="left">Date</th>
+<th align="left"></th>
+<th align="left">Winner/tie</th>
+<th align="left"></th>
+<th align="left">Loser/tie</th>
+<th align="right">PtsW</th>
+<th align="right">PtsL</th>
+</tr>
+</thead>
+<tbody>
+<tr class="">
+<td align="right" >1</td>
+<td align="left" >Thu</td>
+<td align="left" >September 8</td>
+<td align="left" ><a href="/boxscores/201109080gnb.htm">boxscore</a></td>
+<td align="left" ><strong><a href="/teams/gnb/2011.htm">Green Bay Packers</a></strong></td>
+<td align="right" ></td>
+<td align="left" ><a href="/teams/nor/2011.htm">New Orleans Saints</a></td>
+<td align="right" ><strong>42</strong></td>
+<td align="right" >34</td>
+</tr>
+<tr class="">
+<td align="right" >1</td>
+<td align="left" >Sun</td>
+<td align="left" >September 11</td>
+<td align="left" ><a href="/boxscores/201109110chi.htm">boxscore</a></td>
+<td align="left" ><strong><a href="/teams/chi/2011.htm">Chicago Bears</a></strong></td>
+<td align="right" ></td>
+<td align="left" ><a href="/teams/atl/2011.htm">Atlanta Falcons</a></td>
+<td align="right" ><strong>30</strong></td>
+<td align="right" >12</td>
+</tr>
+<tr class="thead">
+<th>Week</th><th>Day</th><th>Date</th><th></th><th>Winner/tie</th>
+<th></th><th>Loser/tie</th><th>PtsW</th><th>PtsL</th>
+</tr>
+<tr class="">
+<td align="right" >Wildcard</td>
+<td align="left" >Sat</td>
+<td align="left" >January 7</td>
+<td align="left" ><a href="/boxscores/201201070htx.htm">boxscore</a></td>
+<td align="left" ><strong><a href="/teams/htx/2011.htm">Houston Texans</a></strong></td>
+<td align="right" >@</td>
+<td align="left" ><a href="/teams/cin/2011.htm">Cincinnati Bengals</a></td>
+<td align="right" ><strong>31</strong></td>
+<td align="right" >10</td>
+</tr>
+<tr class="">
+<td align="right" >SuperBowl</td>
+<td align="left" >Sun</td>
+<td align="left" >February 5</td>
+<td align="left" ><a href="/boxscores/201202050nwe.htm">boxscore</a></td>
+<td align="left" ><strong><a href="/teams/nyg/2011.htm">New York Giants</a></strong></td>
+<td align="right" >N</td>
+<td align="left" ><a href="/teams/nwe/2011.htm">New England Patriots</a></td>
+<td align="right" ><strong>21</strong></td>
+<td align="right" >17</td>
+</tr>
+</tbody>
+</table>
+</body></html>'''
+
+# games table with data-stat attributes and an unplayed game
+NEW_PAGE = '''<table class="sortable stats_table" id="games">
+<thead><tr>
+<th data-stat="week_num">Week</th><th data-stat="game_day_of_week">Day</th>
+<th data-stat="winner">Winner/tie</th><th data-stat="game_location"></th>
+<th data-stat="loser">Loser/tie</th><th data-stat="pts_win">Pts</th>
+<th data-stat="pts_lose">Pts</th>
+</tr></thead>
+<tbody>
+<tr><th data-stat="week_num">3</th><td data-stat="game_day_of_week">Sun</td>
+<td data-stat="winner"><a href="/teams/sfo/2012.htm">San Francisco 49ers</a></td>
+<td data-stat="game_location">@</td>
+<td data-stat="loser"><a href="/teams/min/2012.htm">Minnesota Vikings</a></td>
+<td data-stat="pts_win">24</td><td data-stat="pts_lose">13</td></tr>
+<tr><th data-stat="week_num">4</th><td data-stat="game_day_of_week">Sun</td>
+<td data-stat="winner">Dallas Cowboys</td>
+<td data-stat="game_location">@</td>
+<td data-stat="loser">Chicago Bears</td>
+<td data-stat="pts_win"></td><td data-stat="pts_lose"></td></tr>
+</tbody></table>'''
+
+
+class GamesTableParserTest(unittest.TestCase):
+    def testOldPage(self):
+        '''Testing parser with header names...'''
+        parser = fetchPFRdata.gamesTableParser(2011)
+        games = list(parser.parse(OLD_PAGE, chunkSize=100))
+        self.assertEqual(games, [
+            (2011, 1, 'Green Bay Packers', 'New Orleans Saints', 42, 34),
+            (2011, 1, 'Chicago Bears', 'Atlanta Falcons', 30, 12),
+            (2011, 18, 'Cincinnati Bengals', 'Houston Texans', 10, 31)])
+        self.assertEqual(len(parser.rejected), 1)
+        self.assertTrue('neutral site' in parser.rejected[0][1])
+
+    def testNewPage(self):
+        '''Testing parser with data-stat attributes...'''
+        parser = fetchPFRdata.gamesTableParser(2012)
+        games = list(parser.parse(StringIO.StringIO(NEW_PAGE)))
+        self.assertEqual(len(games), 1)
+        self.assertEqual(games[0].home_team, 'Minnesota Vikings')
+        self.assertEqual(games[0].home_score, 13)
+        self.assertEqual(len(parser.rejected), 1)
+        self.assertTrue('without score' in parser.rejected[0][1])
+
+
+class FetchGamesReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmpdir, 'years', '2011'))
+        with open(os.path.join(self.tmpdir, 'years', '2011', 'games.htm'),
+                  'w') as f:
+            f.write(OLD_PAGE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testReplay(self):
+        '''Testing fetchGames with saved pages...'''
+        db_path = os.path.join(self.tmpdir, 'games.db')
+        fetcher = fetchPFRdata.fetchGames([2011], replayDir=self.tmpdir,
+                                          dbPath=db_path)
+        fetcher.getSeasonGames()
+        con = sqlite3.connect(db_path)
+        games = con.execute('select Year, Week, HomeTeam from games').fetchall()
+        con.close()
+        self.assertEqual(len(games), 3)
+        self.assertEqual(len(fetcher.rejected[2011]), 1)
+
+
+class fakeResponse:
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+    def read(self):
+        return self.body
+
+    def info(self):
+        return self.headers
+
+
+class PageFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.urlopen = urllib2.urlopen
+        self.requests = []
+        self.modified = True
+        urllib2.urlopen = self.fakeUrlopen
+
+    def tearDown(self):
+        urllib2.urlopen = self.urlopen
+        shutil.rmtree(self.tmpdir)
+
+    def fakeUrlopen(self, request, timeout=None):
+        url = request.get_full_url()
+        self.requests.append(request)
+        if not self.modified:
+            raise urllib2.HTTPError(url, 304, 'Not Modified', {}, None)
+        # later pages are answered first
+        time.sleep(0.01 * (3 - int(url[-1])))
+        return fakeResponse('page %s' % url[-1],
+                            {'ETag': '"v1"', 
+                             'Last-Modified': 'Sat, 01 Sep 2012 00:00:00 GMT'})
+
+    def testConditionalRequest(self):
+        '''Testing revalidation of cached pages...'''
+        fetcher = fetchPFRdata.pageFetcher(cacheDir=self.tmpdir, workers=1)
+        url = 'http://example.com/page1'
+        self.assertEqual(fetcher.fetch(url), 'page 1')
+        self.assertEqual(self.requests[0].get_header('If-none-match'), None)
+        self.modified = False
+        self.assertEqual(fetcher.fetch(url), 'page 1')
+        request = self.requests[1]
+        self.assertEqual(request.get_header('If-none-match'), '"v1"')
+        self.assertEqual(request.get_header('If-modified-since'),
+                         'Sat, 01 Sep 2012 00:00:00 GMT')
+
+    def testNotModifiedWithoutCache(self):
+        '''Testing HTTP 304 without cached page...'''
+        fetcher = fetchPFRdata.pageFetcher(workers=1)
+        self.modified = False
+        self.assertRaises(urllib2.HTTPError, fetcher.fetch, 
+                          'http://example.com/page1')
+
+    def testFetchAllOrder(self):
+        '''Testing order of concurrently fetched pages...'''
+        fetcher = fetchPFRdata.pageFetcher(cacheDir=self.tmpdir, workers=3)
+        urls = ['http://example.com/page%d' % i for i in xrange(3)]
+        self.assertEqual(fetcher.fetchAll(urls), 
+                         ['page 0', 'page 1', 'page 2'])
+        self.modified = False
+        self.assertEqual(fetcher.fetchAll(reversed(urls)), 
+                         ['page 2', 'page 1', 'page 0'])
+        self.assertEqual(len(self.requests), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
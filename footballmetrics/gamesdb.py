@@ -0,0 +1,118 @@
+import sqlite3
+import warnings
+
+import instrument
+
+
+GAMES_SCHEMA = '''CREATE TABLE IF NOT EXISTS games (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT, Year INTEGER, Week INTEGER,
+    HomeTeam TEXT, AwayTeam TEXT, HomeScore INTEGER, AwayScore INTEGER)'''
+
+GAMES_INDEXES = [
+    # upsert key, a team plays at most once per week
+    'CREATE UNIQUE INDEX IF NOT EXISTS games_key '
+    'ON games (Year, Week, HomeTeam, AwayTeam)',
+    # covers the season queries of the rankings and standings
+    'CREATE INDEX IF NOT EXISTS games_year_week '
+    'ON games (Year, Week, HomeTeam, AwayTeam, HomeScore, AwayScore)',
+    # team lookups
+    'CREATE INDEX IF NOT EXISTS games_home_team '
+    'ON games (HomeTeam, Year, Week)',
+    'CREATE INDEX IF NOT EXISTS games_away_team '
+    'ON games (AwayTeam, Year, Week)',
+]
+
+STANDINGS_SCHEMA = '''CREATE TABLE IF NOT EXISTS standings (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT, Year INTEGER, Week INTEGER,
+    Team TEXT, Win INTEGER, Loss INTEGER, Tie INTEGER, PointFor INTEGER,
+    PointsAgainst INTEGER)'''
+
+STANDINGS_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS standings_year_week '
+    'ON standings (Year, Week, Team)',
+]
+
+RANKINGS_SCHEMA = '''CREATE TABLE IF NOT EXISTS rankings (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT, Year INTEGER, Week INTEGER,
+    Solver TEXT, Team TEXT, Rating REAL)'''
+
+RANKINGS_INDEXES = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS rankings_key '
+    'ON rankings (Year, Week, Solver, Team)',
+]
+
+
+def connect(db_path):
+    '''
+    Opens the SQLite database at *db_path* and makes sure that the tables
+    and their indexes exist.
+    '''
+    con = sqlite3.connect(db_path)
+    create_schema(con)
+    return con
+
+
+def create_schema(con):
+    '''
+    Creates the games, standings and rankings tables and their indexes.
+    No rows are changed: if a database written before the upsert key 
+    existed holds duplicate games, the unique index is not built until
+    they are removed with ``remove_duplicate_games``.
+    '''
+    with con:
+        con.execute(GAMES_SCHEMA)
+        for index in GAMES_INDEXES[1:]:
+            con.execute(index)
+        if not _has_games_key(con) and not _has_duplicate_games(con):
+            con.execute(GAMES_INDEXES[0])
+        con.execute(STANDINGS_SCHEMA)
+        for index in STANDINGS_INDEXES:
+            con.execute(index)
+        con.execute(RANKINGS_SCHEMA)
+        for index in RANKINGS_INDEXES:
+            con.execute(index)
+
+
+def remove_duplicate_games(con):
+    '''
+    Upgrades a games table written before the upsert key existed: of 
+    duplicate games only the latest row is kept and the unique index is
+    built. Returns the number of removed rows.
+    '''
+    with con:
+        cur = con.execute('DELETE FROM games WHERE Id NOT IN (SELECT MAX(Id) '
+                          'FROM games GROUP BY Year, Week, HomeTeam, '
+                          'AwayTeam)')
+        con.execute(GAMES_INDEXES[0])
+    return cur.rowcount
+
+
+def insert_games(con, games):
+    '''
+    Inserts *games*, given as (year, week, home team, away team, home score,
+    away score) sequences, in a single transaction. Games that are already
+    stored are replaced, so re-fetching a season does not create
+    duplicates. If the table still holds duplicates of an old database,
+    they are removed first (see ``remove_duplicate_games``) with a 
+    warning. Returns the number of written games.
+    '''
+    if not _has_games_key(con):
+        removed = remove_duplicate_games(con)
+        if removed:
+            warnings.warn('Removed %d duplicate games.' % removed)
+    with instrument.stage('gamesdb.insert_games'), con:
+        cur = con.executemany('INSERT OR REPLACE INTO games (Year, Week, '
+                              'HomeTeam, AwayTeam, HomeScore, AwayScore) '
+                              'VALUES (?, ?, ?, ?, ?, ?)', games)
+    return cur.rowcount
+
+
+def _has_games_key(con):
+    return con.execute("SELECT name FROM sqlite_master WHERE type='index' "
+                       "AND name='games_key'").fetchone() is not None
+
+
+def _has_duplicate_games(con):
+    return con.execute('SELECT 1 FROM games GROUP BY Year, Week, HomeTeam, '
+                       'AwayTeam HAVING COUNT(*) > 1 LIMIT 1').fetchone() \
+        is not None
@@ -0,0 +1,76 @@
+import sqlite3
+import unittest
+import warnings
+
+import gamesdb
+
+
+class GamesDBTest(unittest.TestCase):
+    games = [(2011, 1, 'Green Bay Packers', 'New Orleans Saints', 42, 34),
+             (2011, 1, 'Chicago Bears', 'Atlanta Falcons', 30, 12),
+             (2011, 2, 'Atlanta Falcons', 'Philadelphia Eagles', 35, 31)]
+
+    def setUp(self):
+        self.con = gamesdb.connect(':memory:')
+
+    def tearDown(self):
+        self.con.close()
+
+    def testUpsert(self):
+        '''Testing that re-inserting a season does not create duplicates...'''
+        gamesdb.insert_games(self.con, self.games)
+        corrected = [(2011, 2, 'Atlanta Falcons', 'Philadelphia Eagles',
+                      35, 30)]
+        gamesdb.insert_games(self.con, self.games[:2] + corrected)
+        rows = self.con.execute('select Year, Week, HomeTeam, AwayTeam, '
+                                'HomeScore, AwayScore from games '
+                                'order by Week, HomeTeam').fetchall()
+        self.assertEqual(rows, [self.games[1], self.games[0]] + corrected)
+
+    def testLegacyDuplicates(self):
+        '''Testing schema upgrade of a database with duplicate games...'''
+        con = sqlite3.connect(':memory:')
+        con.execute(gamesdb.GAMES_SCHEMA)
+        for game in self.games + self.games:
+            con.execute('insert into games values (null, ?, ?, ?, ?, ?, ?)',
+                        game)
+        gamesdb.create_schema(con)
+        count = con.execute('select count(*) from games').fetchone()[0]
+        self.assertEqual(count, 6)
+        self.assertEqual(gamesdb.remove_duplicate_games(con), 3)
+        count = con.execute('select count(*) from games').fetchone()[0]
+        self.assertEqual(count, 3)
+        gamesdb.insert_games(con, self.games)
+        count = con.execute('select count(*) from games').fetchone()[0]
+        self.assertEqual(count, 3)
+        con.close()
+
+    def testLegacyDuplicatesInsert(self):
+        '''Testing removal of duplicate games when inserting...'''
+        con = sqlite3.connect(':memory:')
+        con.execute(gamesdb.GAMES_SCHEMA)
+        for game in self.games + self.games:
+            con.execute('insert into games values (null, ?, ?, ?, ?, ?, ?)',
+                        game)
+        con.commit()
+        gamesdb.create_schema(con)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            gamesdb.insert_games(con, self.games[:1])
+        self.assertEqual(len(caught), 1)
+        self.assertTrue('3 duplicate' in str(caught[0].message))
+        count = con.execute('select count(*) from games').fetchone()[0]
+        self.assertEqual(count, 3)
+        con.close()
+
+    def testCoveringIndex(self):
+        '''Testing that season queries are answered from an index...'''
+        plan = self.con.execute('explain query plan select HomeTeam, '
+                                'AwayTeam, HomeScore, AwayScore from games '
+                                'where Year=? and Week<=?',
+                                (2011, 17)).fetchall()
+        self.assertTrue('COVERING INDEX games_year_week' in str(plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
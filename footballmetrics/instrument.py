@@ -0,0 +1,163 @@
+import json
+import threading
+import timeit
+
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}
+_callbacks = []
+
+
+class _NullStage(object):
+    # returned by stage() while disabled, entering it does nothing
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = timeit.default_timer() - self.start
+        with _lock:
+            stats = _get(self.name)
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['min'] = min(stats['min'], elapsed)
+            stats['max'] = max(stats['max'], elapsed)
+        for callback in list(_callbacks):
+            callback(self.name, elapsed)
+        return False
+
+
+def _get(name):
+    if name not in _stats:
+        _stats[name] = {'calls': 0, 'total': 0., 'min': float('inf'),
+                        'max': 0., 'counters': {}}
+    return _stats[name]
+
+
+def enable():
+    '''Starts recording of the instrumented stages.'''
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    '''Stops recording, the recorded statistics are kept.'''
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    '''Discards all recorded statistics.'''
+    with _lock:
+        _stats.clear()
+
+
+def stage(name):
+    '''
+    Returns a context manager which records the wall time of the enclosed
+    block as a call of the stage *name*, e.g.::
+
+        with instrument.stage('rankings.solve.svd'):
+            ...
+
+    While the instrumentation is disabled a shared no-op context manager
+    is returned, so an instrumented stage only costs a function call.
+    '''
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def count(name, counter, n=1):
+    '''
+    Adds *n* to the *counter* of the stage *name*, e.g. the number of
+    function evaluations of an optimizer. Does nothing while disabled.
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        counters = _get(name)['counters']
+        counters[counter] = counters.get(counter, 0) + n
+
+
+def add_callback(callback):
+    '''
+    Registers *callback*, which is called with the name and the wall time
+    in seconds whenever a recorded stage ends.
+    '''
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+def get_stats():
+    '''
+    Returns the recorded statistics as a dictionary by stage name. Every
+    stage holds the number of calls, the total, minimal and maximal wall
+    time in seconds and its counters.
+    '''
+    with _lock:
+        stats = {}
+        for name, values in _stats.iteritems():
+            stats[name] = dict(values, counters=dict(values['counters']))
+            if not values['calls']:
+                stats[name]['min'] = 0.
+        return stats
+
+
+def export_stats(path):
+    '''Writes the recorded statistics to the JSON file at *path*.'''
+    with open(path, 'w') as f:
+        json.dump(get_stats(), f, indent=2, sort_keys=True)
+
+
+class recording(object):
+    '''
+    Context manager which enables the instrumentation for the enclosed
+    block and restores the previous state afterwards. The statistics are
+    reset on entry unless *reset* is False::
+
+        with instrument.recording() as stats:
+            ranking.calculate_ranking()
+        print stats.get_stats()
+
+    Stages run in worker processes are not recorded.
+    '''
+    def __init__(self, reset=True):
+        self.reset = reset
+
+    def __enter__(self):
+        self.was_enabled = _enabled
+        if self.reset:
+            reset()
+        enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.was_enabled:
+            disable()
+        return False
+
+    def get_stats(self):
+        return get_stats()
@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import instrument
+import Pythagoreans
+import rankings
+import rankings_test
+
+
+class InstrumentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'games.db')
+        rankings_test.create_test_database(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        instrument.disable()
+        instrument.reset()
+
+    def testDisabled(self):
+        '''Testing that nothing is recorded while disabled...'''
+        ranking = rankings.FISB_Ranking(2011, 17)
+        ranking.load_data(self.db_path)
+        ranking.calculate_ranking()
+        self.assertEqual(instrument.get_stats(), {})
+        self.assertTrue(instrument.stage('a') is instrument.stage('b'))
+
+    def testRecording(self):
+        '''Testing stage timings, call and optimizer counts...'''
+        dataDict = {'teams': ['A', 'B', 'C'], 'pointsFor': [300, 450, 350],
+                    'pointsAgainst': [400, 300, 350],
+                    'wlp': [0.25, 0.8, 0.5], 'nGames': 16}
+        seen = []
+        callback = lambda name, elapsed: seen.append(name)
+        instrument.add_callback(callback)
+        try:
+            with instrument.recording() as recording:
+                for i in xrange(2):
+                    ranking = rankings.FISB_Ranking(2011, 17)
+                    ranking.load_data(self.db_path)
+                    ranking.calculate_ranking()
+                Pythagoreans.Pythagenport(dataDict).calculatePythagorean()
+        finally:
+            instrument.remove_callback(callback)
+        self.assertFalse(instrument.is_enabled())
+        stats = recording.get_stats()
+        for name in ['rankings.load_data.query', 'rankings.game_matrix',
+                     'rankings.solve.svd']:
+            self.assertEqual(stats[name]['calls'], 2)
+            self.assertTrue(stats[name]['total'] >= stats[name]['max'])
+        counters = stats['pythagoreans.optimize.bfgs']['counters']
+        self.assertTrue(counters['function_evaluations'] > 0)
+        self.assertTrue('rankings.solve.svd' in seen)
+        path = os.path.join(self.tmpdir, 'stats.json')
+        instrument.export_stats(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['rankings.solve.svd']['calls'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,13 @@
-import Pythagoreans
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
+import instrument
+import Pythagoreans
+
 class PythagoreansTest(unittest.TestCase):
     testdict={'teams':['A','B','C', 'D'], 'pointsFor':[32, 65, 40, 0], 'pointsAgainst':[56,27,40, 79], \
               'wlp':[2/3., 1.0, 1/3., 0.0], 'nGames':3}
@@ -86,6 +93,189 @@ class PythagoreansTest(unittest.TestCase):
         self.assertEqual(pyth.power, self.knownPowers['Pythagenpat'])
         
     
+    def testGradientOptimizerMatchesFmin(self):
+        '''Testing gradient-based fits against scipy.optimize.fmin...'''
+        for model in [Pythagoreans.PythagoreanExpectation,
+                      Pythagoreans.PythagenportFO,
+                      Pythagoreans.Pythagenpat]:
+            fmin = model(self.testdict)
+            fmin.calculatePythagorean(method='fmin')
+            bfgs = model(self.testdict)
+            bfgs.calculatePythagorean(method='bfgs')
+            for x1, x2 in zip(fmin.getOptimalFitParams(), 
+                              bfgs.getOptimalFitParams()):
+                self.assertAlmostEqual(x1, x2, places=3)
+        # the optimum of Pythagenport lies in a flat valley, so only the
+        # quality of both fits is compared
+        fmin = Pythagoreans.Pythagenport(self.testdict)
+        fmin.calculatePythagorean(method='fmin')
+        bfgs = Pythagoreans.Pythagenport(self.testdict)
+        bfgs.calculatePythagorean(method='bfgs')
+        ssq = [np.sum((np.array(pyth.wlp) - pyth.prediction)**2) 
+               for pyth in [fmin, bfgs]]
+        self.assertTrue(np.all(np.isfinite(bfgs.prediction)))
+        self.assertTrue(ssq[1] <= ssq[0] + 1e-6)
+        
+    def testZeroPoints(self):
+        '''Testing predictions of teams without points...'''
+        prediction = Pythagoreans._pythagoreanPrediction(
+            np.array([0., 10., 0., 0.]), np.array([10., 0., 0., 10.]), 
+            np.array([2., 2., 2., -2.]))
+        np.testing.assert_array_equal(prediction, [0., 1., 0.5, 1.])
+                
+    def testPythagoreanUnknownMethod(self):
+        '''Testing Pythagorean with unknown optimization method...'''
+        pyth = Pythagoreans.PythagoreanExpectation(self.testdict)
+        self.assertRaises(ValueError, pyth.calculatePythagorean, 
+                          method='newton')
+    
+    def testBatchFitMatchesSingleFits(self):
+        '''Testing batched fits against single fits...'''
+        snapshots = [self.testdict, 
+                     {'teams':['A','B','C'], 'pointsFor':[120, 80, 70], 
+                      'pointsAgainst':[70, 90, 110], 'wlp':[1.0, 0.5, 0.25],
+                      'nGames':4}]
+        for model in [Pythagoreans.PythagoreanExpectation,
+                      Pythagoreans.PythagenportFO,
+                      Pythagoreans.Pythagenpat]:
+            for processes in [None, 2]:
+                result = Pythagoreans.fitPythagoreans(model, snapshots, 
+                                                      processes=processes)
+                self.assertEqual(len(result), 7)
+                self.assertEqual(list(result.snapshot), [0] * 4 + [1] * 3)
+                for i, dataDict in enumerate(snapshots):
+                    pyth = model(dataDict)
+                    pyth.calculatePythagorean()
+                    rows = result[result.snapshot == i]
+                    self.assertEqual(list(rows.team), dataDict['teams'])
+                    self.assertAlmostEqual(rows.xopt[0][0], pyth.xopt[0], 
+                                           places=5)
+                    for p1, p2 in zip(rows.prediction, pyth.prediction):
+                        self.assertAlmostEqual(p1, p2, places=5)
+                    
+    def testBatchStaticParams(self):
+        '''Testing batched predictions with static parameters...'''
+        result = Pythagoreans.fitPythagoreans(Pythagoreans.Pythagenpat, 
+                                              [self.testdict], 
+                                              staticParams=[0.287])
+        self.assertEqual(list(result.prediction), 
+                         self.knownPredictions['Pythagenpat'])
+    
+    def testCalibration(self):
+        '''Testing pooled calibration over many seasons...'''
+        rng = np.random.RandomState(0)
+        calibration = Pythagoreans.PythagoreanCalibration(
+            Pythagoreans.Pythagenport)
+        for season in xrange(20):
+            # different scoring levels identify both parameters
+            level = 150 + 25 * season
+            pf = rng.normal(level, level / 6., 32)
+            pa = rng.normal(level, level / 6., 32)
+            x = 1.5 * np.log10((pf + pa) / 16) + 0.45
+            wlp = pf**x / (pf**x + pa**x) + rng.normal(0, 0.02, 32)
+            calibration.addSnapshot({'teams': range(32), 'pointsFor': pf, 
+                                     'pointsAgainst': pa, 'wlp': wlp, 
+                                     'nGames': 16}, 1990 + season)
+        xopt = calibration.calibrate()
+        np.testing.assert_allclose(xopt, [1.5, 0.45], rtol=0.2)
+        residuals = calibration.residuals
+        self.assertEqual(list(residuals.label), range(1990, 2010))
+        self.assertTrue(np.all(residuals.teams == 32))
+        self.assertTrue(np.all(residuals.rmse < 0.04))
+        # a new week of the latest season replaces its snapshot
+        calibration.addSnapshot({'teams': range(32), 'pointsFor': pf * 1.05,
+                                 'pointsAgainst': pa * 1.05, 'wlp': wlp, 
+                                 'nGames': 17}, 2009)
+        with instrument.recording() as recording:
+            calibration.calibrate()
+        counters = recording.get_stats()['pythagoreans.optimize.bfgs']
+        self.assertEqual(len(calibration.labels()), 20)
+        self.assertTrue(counters['counters']['function_evaluations'] < 10)
+    
+    def testCacheHit(self):
+        '''Testing that cached results are returned without optimizing...'''
+        cache = Pythagoreans.PythagoreanCache()
+        pyth = Pythagoreans.Pythagenport(self.testdict)
+        expected = pyth.calculatePythagorean(cache=cache)
+        pyth = Pythagoreans.Pythagenport(self.testdict)
+        pyth.guess = None  # would break a new optimization
+        self.assertEqual(pyth.calculatePythagorean(cache=cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        other = Pythagoreans.Pythagenpat(self.testdict)
+        other.calculatePythagorean(cache=cache)
+        self.assertEqual(cache.misses, 2)
+    
+    def testCacheSizeAndDisk(self):
+        '''Testing the LRU bound and the on-disk tier of the cache...'''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = Pythagoreans.PythagoreanCache(maxSize=2, directory=tmpdir)
+            for params in [[1.5, 0.45], [1.4, 0.5], [1.3, 0.55]]:
+                pyth = Pythagoreans.Pythagenport(self.testdict)
+                pyth.calculatePythagorean(optimize=False, staticParams=params,
+                                          cache=cache)
+            self.assertEqual(len(cache), 2)
+            cache = Pythagoreans.PythagoreanCache(directory=tmpdir)
+            pyth = Pythagoreans.Pythagenport(self.testdict)
+            prediction, power = pyth.calculatePythagorean(
+                optimize=False, staticParams=[1.5, 0.45], cache=cache)
+            self.assertEqual(cache.hits, 1)
+            np.testing.assert_allclose(power, 
+                                       self.knownPowers['Pythagenport'])
+            self.assertEqual(len(os.listdir(tmpdir)), 3)
+        finally:
+            shutil.rmtree(tmpdir)
+    
+    def testCacheUnreadableEntry(self):
+        '''Testing that a half-written cache entry is a miss...'''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = Pythagoreans.PythagoreanCache(directory=tmpdir)
+            pyth = Pythagoreans.Pythagenport(self.testdict)
+            key = cache.key(pyth)
+            with open(os.path.join(tmpdir, key + '.json'), 'w') as f:
+                f.write('{"model": "Pythagenport", "xo')
+            self.assertEqual(cache.get(key), None)
+            self.assertEqual(cache.misses, 1)
+            pyth.calculatePythagorean(cache=cache)
+            self.assertEqual(Pythagoreans.PythagoreanCache(
+                directory=tmpdir).get(key)['xopt'], list(pyth.xopt))
+        finally:
+            shutil.rmtree(tmpdir)
+    
+    def testCacheWarmStart(self):
+        '''Testing the warm start from the fit of the previous week...'''
+        rng = np.random.RandomState(2)
+        strength = rng.normal(0, 5, 32)
+        pf = np.zeros(32)
+        pa = np.zeros(32)
+        cache = Pythagoreans.PythagoreanCache()
+        for week in xrange(1, 17):
+            pf += 21 + strength + rng.normal(0, 7, 32)
+            pa += 21 - strength + rng.normal(0, 7, 32)
+            ratio = (pf / pa) ** 2.4
+            dataDict = {'teams': range(32), 'pointsFor': pf.copy(), 
+                        'pointsAgainst': pa.copy(), 
+                        'wlp': ratio / (1 + ratio), 'nGames': week}
+            if week == 16:
+                self.assertTrue(cache.warmStart(
+                    Pythagoreans.Pythagenpat(dataDict)) is not None)
+                evaluations = []
+                for pythCache in [cache, None]:
+                    pyth = Pythagoreans.Pythagenpat(dataDict)
+                    with instrument.recording() as recording:
+                        pyth.calculatePythagorean(cache=pythCache)
+                    evaluations.append(recording.get_stats()[
+                        'pythagoreans.optimize.bfgs']['counters']
+                        ['function_evaluations'])
+                    xopt = pyth.xopt
+            else:
+                Pythagoreans.Pythagenpat(dataDict).calculatePythagorean(
+                    cache=cache)
+        warm = cache.get(cache.key(Pythagoreans.Pythagenpat(dataDict)))
+        np.testing.assert_allclose(warm['xopt'], xopt, rtol=1e-4)
+        self.assertTrue(evaluations[0] < evaluations[1])
+        
     def testPythagoreanOptNoParams(self):
         '''Testing Pythagorean without optimization and missing parameters...'''
         pyth = Pythagoreans.Pythagorean(self.testdict)
@@ -1,13 +1,14 @@
 from __future__ import division
 import os
-import random
 
 import sqlite3
 import numpy as np
-import scipy.linalg
 
+import instrument
+from teams import TeamRegistry
 
-class FISB_Ranking:
+
+class FISB_Ranking(object):
     '''
     This class calculates a ranking similar to Sagarin's. It uses all
     games played in the season given by *year* and the given *week* 
@@ -19,84 +20,337 @@ class FISB_Ranking:
     def __init__(self, year=2011, week=17):
         self.year = year
         self.week = week
+        self.registry = TeamRegistry()
+        self.__set_games([], [], [], [], [])
+        self.__normal = None
+        
+    @property
+    def teams(self):
+        '''The sorted names of the loaded teams.'''
+        return self.registry.names
+        
+    @property
+    def games(self):
+        '''
+        The loaded games as (home team, away team, home score, away score)
+        tuples.
+        '''
+        return zip([self.teams[i] for i in self.__home], 
+                   [self.teams[i] for i in self.__away],
+                   np.asarray(self.__home_scores).tolist(), 
+                   np.asarray(self.__away_scores).tolist())
                 
     def load_data(self, db_path):
         ''' Loads the data from a SQLite database at location *db_path*.'''
         if not os.path.isfile(db_path):
             raise IOError('Database file not found.')
         con = sqlite3.connect(db_path)
-        with con:
+        with instrument.stage('rankings.load_data.query'), con:
             cur = con.cursor()
-            cur.execute('select HomeTeam, AwayTeam, HomeScore, AwayScore \
-                from games where year=%d and week<=%d' % 
-                (self.year, self.week))
-            self.games = cur.fetchall()
-        teams = []
-        for game in self.games:
-            if game[0] not in teams:
-                teams.append(str(game[0]).encode())
-            if game[1] not in teams:
-                teams.append(str(game[1]).encode())
-        self.teams = sorted(teams) 
+            cur.execute('select HomeTeam, AwayTeam, HomeScore, AwayScore, \
+                Week from games where year=? and week<=?', 
+                        (self.year, self.week))
+            games = cur.fetchall()
+        with instrument.stage('rankings.load_data.teams'):
+            self.registry = TeamRegistry()
+            home = self.registry.intern([game[0] for game in games])
+            away = self.registry.intern([game[1] for game in games])
+            order = self.registry.sort()
+        self.__set_games(order[home], order[away],
+                         [game[2] for game in games],
+                         [game[3] for game in games],
+                         [game[4] for game in games])
+        self.__normal = None
+        
+    def load_store(self, store):
+        '''
+        Loads the data from a columnar season store (see 
+        ``seasonstore.SeasonStore``). The scores are used as 
+        memory-mapped views of the store without copying them.
+        '''
+        games = store.games(self.year, self.week)
+        codes, index = np.unique(np.concatenate((games['home'], 
+                                                 games['away'])), 
+                                 return_inverse=True)
+        # the team codes of the store follow the sorted team names
+        self.registry = TeamRegistry([store.teams[code] for code in codes])
+        n_games = len(games['home'])
+        self.__set_games(index[:n_games], index[n_games:], 
+                         games['home_score'], games['away_score'],
+                         games['week'])
+        self.__normal = None
+    
+    def add_games(self, games, week=None):
+        '''
+        Adds new *games* given as (home team, away team, home score, 
+        away score) tuples, e.g. the results of a single Sunday. They are
+        recorded as games of *week*, by default the week after the latest
+        loaded game.
+        The normal equations of the least-squares problem are updated in
+        place, so that ``calculate_ranking(solver='normal')`` afterwards
+        only needs to solve a (teams+1) x (teams+1) system instead of
+        reloading and decomposing the whole season.
+        '''
+        games = list(games)
+        if week is None:
+            week = self.__weeks.max() + 1 if len(self.__weeks) else 1
+        if self.__normal is None:
+            self.__accumulate_normal(reset=True)
+        n_teams = len(self.registry)
+        home = self.registry.intern([game[0] for game in games])
+        away = self.registry.intern([game[1] for game in games])
+        if len(self.registry) > n_teams:
+            order = self.registry.sort()
+            # move the accumulated sums to the rows of the enlarged system
+            n = len(self.registry) + 1
+            keep = np.append(order[:n_teams], n-1)
+            normal = np.zeros((n, n))
+            normal[np.ix_(keep, keep)] = self.__normal
+            rhs = np.zeros(n)
+            rhs[keep] = self.__rhs
+            self.__normal, self.__rhs = normal, rhs
+            self.__home, self.__away = order[self.__home], order[self.__away]
+            home, away = order[home], order[away]
+        margins = np.array([float(game[-2]) - float(game[-1]) 
+                            for game in games])
+        self.__set_games(np.concatenate((self.__home, home)),
+                         np.concatenate((self.__away, away)),
+                         np.concatenate((self.__home_scores, 
+                                         [game[-2] for game in games])),
+                         np.concatenate((self.__away_scores, 
+                                         [game[-1] for game in games])),
+                         np.concatenate((self.__weeks, 
+                                         np.zeros(len(games), dtype=int) + 
+                                         week)))
+        self.__accumulate_normal(home, away, margins)
         
-    def calculate_ranking(self, bootstrapping=False, iterations=100):
+    def calculate_ranking(self, bootstrapping=False, iterations=100, 
+                          seed=None, processes=None, solver='svd'):
         '''
         Calculates the ranking based on the data loaded in ``load_data``.
         It uses a singular value decomposition (SVD) to decompose 
         the game matrix. It returns the ratings for each team and the 
         home field advantage.
+        With *solver* = 'normal' the accumulated normal equations, which
+        are updated by ``add_games``, are solved.
+        With *solver* = 'sparse' the game matrix is stored as a sparse
+        incidence matrix and the least-squares problem is solved 
+        iteratively with LSQR, which scales to thousands of games and
+        hundreds of teams.
         If *bootstrapping* = True, the game matrix will be randomized as often
-        as given in iteration.
+        as given in iteration and the mean ratings are returned. The full
+        statistics of ``bootstrap_ranking`` are kept in 
+        *self.bootstrap_stats*.
         '''
-        home_margins = self.__get_home_margins()
-        game_matrix = self.__get_game_matrix()
         if bootstrapping and iterations > 0:
-            random_x = []
-            # randomly pick games and create new game matrix with these
-            # randomized games
-            for n in xrange(iterations):
-                # list contains random indices of games to be chosen
-                #random_list = []
-                random_list = [random.randint(0, len(self.games)-1) 
-                               for N in self.games]
-                # generate a random game matrix and random home_margins
-                # and solve the equation system for each iteration.
-                random_game_matrix = np.zeros(game_matrix.shape)
-                random_margins = np.zeros(home_margins.shape)
-                for i in random_list:
-                    random_game_matrix[i,:] = game_matrix[random_list[i], :]
-                    random_margins[i] = home_margins[random_list[i]]
-                random_x.append(self.__decompose_matrix(random_game_matrix,
-                                                       random_margins))
-            x = np.mean(random_x, axis=0)
+            self.bootstrap_stats = self.bootstrap_ranking(iterations, 
+                                                          seed=seed,
+                                                          processes=processes)
+            self.ratings = dict(self.bootstrap_stats['mean'])
+            return self.ratings
+        if solver == 'svd':
+            with instrument.stage('rankings.game_matrix'):
+                home_margins = self.__get_home_margins()
+                game_matrix = self.__get_game_matrix()
+            with instrument.stage('rankings.solve.svd'):
+                x = self.__decompose_matrix(game_matrix, home_margins)
+        elif solver == 'sparse':
+            with instrument.stage('rankings.game_matrix'):
+                home_margins = self.__get_home_margins()
+                game_matrix = self.__get_sparse_game_matrix()
+            with instrument.stage('rankings.solve.sparse'):
+                x = self.__solve_sparse(game_matrix, home_margins)
+        elif solver == 'normal':
+            if self.__normal is None:
+                with instrument.stage('rankings.game_matrix'):
+                    self.__accumulate_normal(reset=True)
+            with instrument.stage('rankings.solve.normal'):
+                x = self.__solve_normal()
         else:
-            x = self.__decompose_matrix(game_matrix, home_margins)
+            raise ValueError('Unknown solver: %s' % solver)
         self.ratings = {}
         for i in xrange(len(self.teams)):
             self.ratings[self.teams[i]] = float(x[i])
         self.ratings = self.__normalize(self.ratings)
         self.ratings['Home field advantage'] = float(x[-1])
-        return self.ratings           
+        return self.ratings
+
+    def residual_std(self):
+        '''
+        Returns the standard deviation of the differences between the
+        home margins of the loaded games and the margins predicted by the
+        ratings of the last ``calculate_ranking``, corrected for the 
+        degrees of freedom of the fit.
+        '''
+        ratings = np.array([self.ratings[team] for team in self.teams])
+        predicted = (ratings[self.__home] - ratings[self.__away] + 
+                     self.ratings['Home field advantage'])
+        residuals = self.__get_home_margins() - predicted
+        dof = max(len(residuals) - len(self.teams), 1)
+        return float(np.sqrt(np.sum(residuals**2) / dof))
+
+    def bootstrap_ranking(self, iterations=1000, seed=None, alpha=0.05,
+                          batch_size=100, processes=None):
+        '''
+        Bootstraps the ranking by resampling the games with replacement
+        *iterations* times. All resample indices are drawn at once from a
+        generator seeded with *seed*. The resampled least-squares systems
+        are solved in batches of *batch_size* via their normal equations,
+        optionally distributed over a pool of *processes* workers.
+        Returns a dictionary with the keys 'mean', 'std_error', 'lower' and
+        'upper', each holding a rating per team and the home field 
+        advantage. 'lower' and 'upper' are the bounds of the percentile 
+        interval with coverage 1 - *alpha*.
+        '''
+        cols = self.__get_game_columns(self.__home, self.__away)
+        home_margins = self.__get_home_margins()
+        rng = np.random.RandomState(seed)
+        n_games = len(self.__home)
+        indices = rng.randint(0, n_games, size=(iterations, n_games))
+        batches = [(cols, len(self.teams)+1, home_margins, 
+                    indices[i:i+batch_size])
+                   for i in xrange(0, iterations, batch_size)]
+        with instrument.stage('rankings.solve.bootstrap'):
+            if processes is not None and processes > 1:
+                import multiprocessing
+                pool = multiprocessing.Pool(processes)
+                try:
+                    samples = pool.map(_solve_bootstrap_batch, batches)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                samples = map(_solve_bootstrap_batch, batches)
+        instrument.count('rankings.solve.bootstrap', 'resamples', iterations)
+        samples = np.vstack(samples)
+        samples[:, :-1] -= samples[:, :-1].mean(axis=1)[:, np.newaxis]
+        lower, upper = np.percentile(samples, [50*alpha, 100-50*alpha], 
+                                     axis=0)
+        stats = {'mean': samples.mean(axis=0), 
+                 'std_error': samples.std(axis=0, ddof=1),
+                 'lower': lower, 'upper': upper}
+        names = self.teams + ['Home field advantage']
+        for key in stats:
+            stats[key] = dict(zip(names, map(float, stats[key])))
+        return stats
     
+    def weekly_ratings(self, decay=1.):
+        '''
+        Calculates the ratings as of every week of the loaded games in a
+        single pass. The normal equations of the games of every week are
+        built once and accumulated week by week, so the system after a
+        week reuses the sums of all weeks before.
+        With *decay* < 1 older games are down-weighted (weighted least 
+        squares): a game played k weeks ago has the weight decay**k.
+        Returns the weeks and an array of shape (teams + 1, weeks) holding 
+        the ratings of self.teams after every week and the home field 
+        advantage in the last row. Teams which have not played yet are NaN.
+        With *decay* = 1 every column equals ``calculate_ranking`` of 
+        the games up to that week.
+        '''
+        if not 0 < decay <= 1:
+            raise ValueError('Decay needs to be in (0, 1].')
+        weeks, week_ids = np.unique(self.__weeks, return_inverse=True)
+        n = len(self.teams) + 1
+        cols = self.__get_game_columns(self.__home, self.__away)
+        margins = self.__get_home_margins()
+        signs = [1., -1., 1.]
+        normal = np.zeros((len(weeks), n, n))
+        rhs = np.zeros((len(weeks), n))
+        for i in xrange(3):
+            np.add.at(rhs, (week_ids, cols[:, i]), signs[i] * margins)
+            for j in xrange(3):
+                np.add.at(normal, (week_ids, cols[:, i], cols[:, j]), 
+                          signs[i] * signs[j])
+        # N(w) = decay**(w - w') * N(w') + N_w for consecutive weeks w' < w
+        factors = decay ** np.diff(weeks).astype(float)
+        for k in xrange(1, len(weeks)):
+            normal[k] += factors[k-1] * normal[k-1]
+            rhs[k] += factors[k-1] * rhs[k-1]
+        with instrument.stage('rankings.solve.weekly'):
+            x = np.einsum('wij,wj->wi', np.linalg.pinv(normal, rcond=1e-10),
+                          rhs)
+        played = np.zeros((len(weeks), n-1), dtype=bool)
+        played[week_ids, self.__home] = True
+        played[week_ids, self.__away] = True
+        played = np.logical_or.accumulate(played, axis=0)
+        ratings = np.where(played, x[:, :-1], np.nan)
+        ratings -= (np.nansum(ratings, axis=1) / 
+                    np.maximum(played.sum(axis=1), 1))[:, np.newaxis]
+        return weeks, np.vstack((ratings.T, x[:, -1]))
+    
+    def __set_games(self, home, away, home_scores, away_scores, weeks):
+        # games are kept as arrays of team indices into self.teams, the
+        # scores and the weeks
+        self.__home = np.asarray(home, dtype=int)
+        self.__away = np.asarray(away, dtype=int)
+        self.__home_scores = np.asarray(home_scores)
+        self.__away_scores = np.asarray(away_scores)
+        self.__weeks = np.asarray(weeks, dtype=int)
+        
     def __get_home_margins(self):
-        home_margins = [float(x[-2]) - float(x[-1]) for x in self.games]
-        return np.array(home_margins)
+        return np.subtract(self.__home_scores, self.__away_scores, 
+                           dtype=float)
 
+    def __get_game_columns(self, home, away):
+        # columns of the non-zeros of every game row:
+        # game = home score - away score + home field advantage
+        return np.column_stack((home, away, np.zeros(len(home), dtype=int) +
+                                len(self.teams)))
+    
     def __get_game_matrix(self):
         # rows = games
         # columns = teams + home field advantage
-        matrix = np.zeros((len(self.games), len(self.teams)+1))
-        for i in xrange(matrix.shape[0]):
-            index_home = self.teams.index(self.games[i][0])
-            index_away = self.teams.index(self.games[i][1])
-            # game = home score - away score + home field advantage
-            matrix[i, index_home] = 1
-            matrix[i, index_away] = -1
-            matrix[i, -1] = 1
+        n_games = len(self.__home)
+        matrix = np.zeros((n_games, len(self.teams)+1))
+        cols = self.__get_game_columns(self.__home, self.__away)
+        matrix[np.arange(n_games)[:, np.newaxis], cols] = [1., -1., 1.]
         return matrix
     
+    def __get_sparse_game_matrix(self):
+        # same layout as __get_game_matrix with three non-zeros per row
+        import scipy.sparse
+        n_games = len(self.__home)
+        rows = np.repeat(np.arange(n_games), 3)
+        cols = self.__get_game_columns(self.__home, self.__away).ravel()
+        data = np.tile([1., -1., 1.], n_games)
+        return scipy.sparse.csr_matrix((data, (rows, cols)), 
+                                       shape=(n_games, len(self.teams)+1))
+    
+    def __solve_sparse(self, matrix, margins, tol=1e-12):
+        # LSQR started at zero converges to the minimum-norm least-squares
+        # solution, i.e. the same solution as the pseudo-inverse of the SVD.
+        import scipy.sparse.linalg
+        x = scipy.sparse.linalg.lsqr(matrix, margins, atol=tol, btol=tol,
+                                     iter_lim=10*matrix.shape[1])[0]
+        return x
+    
+    def __accumulate_normal(self, home=None, away=None, margins=None, 
+                            reset=False):
+        # adds a^T a and a^T * margin of every game row a to the sums,
+        # all loaded games are used if no games are given
+        n = len(self.teams) + 1
+        if reset:
+            self.__normal = np.zeros((n, n))
+            self.__rhs = np.zeros(n)
+        if home is None:
+            home, away = self.__home, self.__away
+            margins = self.__get_home_margins()
+        cols = self.__get_game_columns(home, away)
+        signs = [1., -1., 1.]
+        for i in xrange(3):
+            np.add.at(self.__rhs, cols[:, i], signs[i] * margins)
+            for j in xrange(3):
+                np.add.at(self.__normal, (cols[:, i], cols[:, j]), 
+                          signs[i] * signs[j])
+    
+    def __solve_normal(self, eps=1e-10):
+        # the pseudo-inverse picks the minimum-norm solution like the SVD
+        return np.dot(np.linalg.pinv(self.__normal, rcond=eps), self.__rhs)
+    
     def __decompose_matrix(self, matrix, margins, eps=1e-10):
         # decompose game game_matrix using SVD
+        import scipy.linalg
         U, s, Vh = scipy.linalg.svd(matrix)
         # extract singular values s and make diagonal game_matrix s_prime. 
         # Set reciprocal of s to s_prime. Set s_prime to 0, if s < eps. 
@@ -118,4 +372,28 @@ class FISB_Ranking:
         sum /= len(self.teams)
         for team in ratings.iterkeys():
             ratings[team] -= sum
-        return ratings
\ No newline at end of file
+        return ratings
+
+
+def _solve_bootstrap_batch(args):
+    # Solves the least-squares systems of a batch of resamples. A resample
+    # is fully described by how often every game was drawn, so its normal
+    # equations are a count-weighted sum of the per-game outer products,
+    # which are accumulated from the three non-zeros of every game row.
+    # The pseudo-inverse yields the same minimum-norm solution as the SVD.
+    cols, n, home_margins, indices = args
+    n_resamples, n_games = indices.shape
+    resamples = np.arange(n_resamples)[:, np.newaxis]
+    counts = np.bincount((indices + resamples * n_games).ravel(), 
+                         minlength=n_resamples*n_games)
+    counts = counts.reshape(n_resamples, n_games).astype(float)
+    normal = np.zeros((n_resamples, n, n))
+    rhs = np.zeros((n_resamples, n))
+    signs = [1., -1., 1.]
+    for i in xrange(3):
+        np.add.at(rhs, (resamples, cols[:, i]), 
+                  signs[i] * counts * home_margins)
+        for j in xrange(3):
+            np.add.at(normal, (resamples, cols[:, i], cols[:, j]), 
+                      signs[i] * signs[j] * counts)
+    return np.einsum('bij,bj->bi', np.linalg.pinv(normal, rcond=1e-10), rhs)
@@ -0,0 +1,171 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+
+import gamesdb
+import rankings
+
+
+def create_test_database(db_path, year=2011, n_teams=8, n_rounds=2, seed=0):
+    '''
+    Writes a games table of a double round robin season with known
+    team strengths (1, 2, ..., n_teams) and a home field advantage of 3.
+    '''
+    rng = np.random.RandomState(seed)
+    games = []
+    week = 1
+    for r in xrange(n_rounds):
+        for home in xrange(n_teams):
+            for away in xrange(n_teams):
+                if home == away:
+                    continue
+                margin = (home - away) + 3 + rng.normal(0, 5)
+                home_score = 20 + int(round(max(margin, 0)))
+                away_score = 20 + int(round(max(-margin, 0)))
+                games.append((year, week, 'Team%d' % home, 'Team%d' % away,
+                              home_score, away_score))
+                week = week % 17 + 1
+    con = gamesdb.connect(db_path)
+    gamesdb.insert_games(con, games)
+    con.close()
+
+
+class FISBRankingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'games.db')
+        create_test_database(self.db_path)
+        self.ranking = rankings.FISB_Ranking(2011, 17)
+        self.ranking.load_data(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testRanking(self):
+        '''Testing FISB_Ranking with known team strengths...'''
+        ratings = self.ranking.calculate_ranking()
+        self.assertEqual(len(ratings), 9)
+        self.assertAlmostEqual(sum(ratings[t] for t in self.ranking.teams),
+                               0.)
+        self.assertTrue(ratings['Team7'] > ratings['Team0'])
+        self.assertTrue(ratings['Home field advantage'] > 0)
+
+    def testSparseSolver(self):
+        '''Testing the sparse solver against the SVD...'''
+        svd = dict(self.ranking.calculate_ranking(solver='svd'))
+        sparse = self.ranking.calculate_ranking(solver='sparse')
+        for team in svd:
+            self.assertAlmostEqual(svd[team], sparse[team])
+
+    def testUnknownSolver(self):
+        '''Testing FISB_Ranking with unknown solver...'''
+        self.assertRaises(ValueError, self.ranking.calculate_ranking,
+                          solver='qr')
+
+    def testIncrementalUpdates(self):
+        '''Testing incremental updates against a full recompute...'''
+        full = self.ranking.calculate_ranking()
+        games = self.ranking.games
+        incremental = rankings.FISB_Ranking(2011, 17)
+        for week in xrange(0, len(games), 10):
+            incremental.add_games(games[week:week+10])
+            ratings = incremental.calculate_ranking(solver='normal')
+        self.assertEqual(incremental.teams, self.ranking.teams)
+        for team in full:
+            self.assertAlmostEqual(full[team], ratings[team])
+        recompute = incremental.calculate_ranking(solver='svd')
+        for team in full:
+            self.assertAlmostEqual(recompute[team], ratings[team])
+
+    def testWeeklyRatings(self):
+        '''Testing weekly ratings against a ranking of every week...'''
+        weeks, ratings = self.ranking.weekly_ratings()
+        self.assertEqual(weeks.tolist(), range(1, 18))
+        self.assertEqual(ratings.shape, (9, 17))
+        for i, week in enumerate(weeks):
+            ranking = rankings.FISB_Ranking(2011, week)
+            ranking.load_data(self.db_path)
+            expected = ranking.calculate_ranking()
+            names = self.ranking.teams + ['Home field advantage']
+            for j, team in enumerate(names):
+                if team in expected:
+                    self.assertAlmostEqual(ratings[j, i], expected[team])
+                else:
+                    self.assertTrue(np.isnan(ratings[j, i]))
+
+    def testDecayedRatings(self):
+        '''Testing decayed weekly ratings against weighted least squares...'''
+        decay = 0.8
+        weeks, ratings = self.ranking.weekly_ratings(decay=decay)
+        con = sqlite3.connect(self.db_path)
+        games = con.execute('select HomeTeam, AwayTeam, HomeScore, '
+                            'AwayScore, Week from games').fetchall()
+        con.close()
+        weights = np.sqrt(decay ** (17. - np.array([game[4] 
+                                                    for game in games])))
+        teams = self.ranking.teams
+        matrix = np.zeros((len(games), len(teams)+1))
+        for i, game in enumerate(games):
+            matrix[i, teams.index(game[0])] = 1
+            matrix[i, teams.index(game[1])] = -1
+            matrix[i, -1] = 1
+        margins = np.array([game[2] - game[3] for game in games], dtype=float)
+        x = np.linalg.lstsq(matrix * weights[:, np.newaxis], 
+                            margins * weights, rcond=None)[0]
+        x[:-1] -= x[:-1].mean()
+        np.testing.assert_allclose(ratings[:, -1], x, atol=1e-8)
+        self.assertRaises(ValueError, self.ranking.weekly_ratings, decay=0)
+
+    def testBootstrapSeed(self):
+        '''Testing that seeded bootstraps are reproducible...'''
+        stats1 = self.ranking.bootstrap_ranking(200, seed=42, batch_size=64)
+        stats2 = self.ranking.bootstrap_ranking(200, seed=42)
+        for key in stats1:
+            for team in stats1[key]:
+                self.assertAlmostEqual(stats1[key][team], stats2[key][team])
+
+    def testBootstrapBatch(self):
+        '''Testing batched resample solutions against least squares...'''
+        rng = np.random.RandomState(5)
+        home = rng.randint(0, 6, 40)
+        away = (home + rng.randint(1, 6, 40)) % 6
+        cols = np.column_stack((home, away, np.zeros(40, dtype=int) + 6))
+        margins = rng.normal(3, 10, 40)
+        indices = rng.randint(0, 40, size=(3, 40))
+        samples = rankings._solve_bootstrap_batch((cols, 7, margins, 
+                                                   indices))
+        for sample, resample in zip(samples, indices):
+            matrix = np.zeros((40, 7))
+            matrix[np.arange(40)[:, np.newaxis], cols] = [1., -1., 1.]
+            x = np.linalg.lstsq(matrix[resample], margins[resample], 
+                                rcond=None)[0]
+            np.testing.assert_allclose(sample, x, atol=1e-8)
+
+    def testBootstrapStatistics(self):
+        '''Testing bootstrap means, standard errors and intervals...'''
+        ratings = dict(self.ranking.calculate_ranking())
+        boot = self.ranking.calculate_ranking(bootstrapping=True,
+                                              iterations=500, seed=1)
+        stats = self.ranking.bootstrap_stats
+        for team in ratings:
+            self.assertTrue(stats['std_error'][team] > 0)
+            self.assertTrue(stats['lower'][team] < boot[team] <
+                            stats['upper'][team])
+            self.assertTrue(abs(boot[team] - ratings[team]) <
+                            stats['std_error'][team])
+
+    def testBootstrapPool(self):
+        '''Testing bootstrap in a process pool...'''
+        serial = self.ranking.bootstrap_ranking(100, seed=3)
+        pooled = self.ranking.bootstrap_ranking(100, seed=3, processes=2)
+        for team in serial['mean']:
+            self.assertAlmostEqual(serial['mean'][team],
+                                   pooled['mean'][team])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import argparse
+import shutil
+import sys
+import tempfile
+
+import gamesdb
+import instrument
+import rankings
+import seasonstore
+
+
+# season store of the worker processes, opened once per process
+_store = None
+
+
+def _init_worker(store_path):
+    global _store
+    _store = seasonstore.SeasonStore(store_path)
+
+
+def _rank_slice(args):
+    year, week, solver = args
+    ranking = rankings.FISB_Ranking(year, week)
+    ranking.load_store(_store)
+    if not ranking.teams:
+        return year, week, solver, {}
+    return year, week, solver, ranking.calculate_ranking(solver=solver)
+
+
+def finished_slices(con, solver='svd'):
+    '''
+    Returns the set of (year, week) pairs whose rankings by *solver* are
+    stored in the rankings table of the connection *con*.
+    '''
+    return set(con.execute('SELECT DISTINCT Year, Week FROM rankings '
+                           'WHERE Solver=?', (solver,)).fetchall())
+
+
+def load_rankings(con, year, week, solver='svd'):
+    '''
+    Returns the stored ratings of the *year* and *week* by *solver* as a
+    dictionary like ``FISB_Ranking.calculate_ranking``.
+    '''
+    return dict(con.execute('SELECT Team, Rating FROM rankings WHERE Year=? '
+                            'AND Week=? AND Solver=?',
+                            (year, week, solver)).fetchall())
+
+
+def rank_seasons(db_path, slices, processes=None, solver='svd',
+                 store_path=None, output_path=None, resume=True,
+                 batch_size=50):
+    '''
+    Calculates the FISB rankings of all (year, week) pairs in *slices*
+    and stores them in the rankings table of the database at
+    *output_path* (by default the games database at *db_path*).
+
+    The games are read from SQLite only once: they are exported to a
+    columnar season store (or the store at *store_path* is used), which
+    the workers of a pool of *processes* processes map read-only. The
+    rankings are written in transactions of *batch_size* slices, so an
+    interrupted run keeps all finished batches. If *resume* = True,
+    slices which are already stored are skipped.
+    Returns the list of the ranked slices.
+    '''
+    con = gamesdb.connect(output_path or db_path)
+    todo = sorted(set(slices))
+    if resume:
+        finished = finished_slices(con, solver)
+        todo = [s for s in todo if s not in finished]
+    tmpdir = None
+    try:
+        if todo and store_path is None:
+            tmpdir = tempfile.mkdtemp()
+            store_path = tmpdir
+            games = gamesdb.connect(db_path)
+            with instrument.stage('runner.export_store'):
+                seasonstore.export_store(games, store_path)
+            games.close()
+        tasks = [(year, week, solver) for year, week in todo]
+        if processes is not None and processes > 1 and tasks:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes, _init_worker,
+                                        (store_path,))
+            try:
+                results = pool.imap_unordered(_rank_slice, tasks,
+                                              chunksize=4)
+                _write_rankings(con, results, batch_size)
+            finally:
+                pool.close()
+                pool.join()
+        elif tasks:
+            _init_worker(store_path)
+            _write_rankings(con, (_rank_slice(task) for task in tasks),
+                            batch_size)
+    finally:
+        con.close()
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+    return todo
+
+
+def _write_rankings(con, results, batch_size):
+    rows = []
+    n_slices = 0
+    for year, week, solver, ratings in results:
+        rows += [(year, week, solver, team, rating)
+                 for team, rating in ratings.iteritems()]
+        n_slices += 1
+        if n_slices % batch_size == 0:
+            _insert_rankings(con, rows)
+            rows = []
+    _insert_rankings(con, rows)
+
+
+def _insert_rankings(con, rows):
+    with instrument.stage('runner.insert_rankings'), con:
+        con.executemany('INSERT OR REPLACE INTO rankings (Year, Week, '
+                        'Solver, Team, Rating) VALUES (?, ?, ?, ?, ?)', rows)
+
+
+def _parse_range(text):
+    # '2002-2005,2008' -> [2002, 2003, 2004, 2005, 2008]
+    values = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        values += range(int(first), int(last or first) + 1)
+    return values
+
+
+def main(argv=None):
+    '''Command line interface of rank_seasons.'''
+    parser = argparse.ArgumentParser(description='Calculates the FISB '
+                                     'rankings of many seasons and weeks.')
+    parser.add_argument('--db', default='nfl_games.db',
+                        help='SQLite database with the games table')
+    parser.add_argument('--years', required=True,
+                        help='years, e.g. 2002-2011 or 2009,2011')
+    parser.add_argument('--weeks', default='1-17', help='weeks (default 1-17)')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--solver', default='svd',
+                        choices=['svd', 'sparse', 'normal'])
+    parser.add_argument('--store', help='existing season store to read from')
+    parser.add_argument('--output', help='database for the rankings table '
+                        '(default: --db)')
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help='recompute slices which are already stored')
+    args = parser.parse_args(argv)
+    slices = [(year, week) for year in _parse_range(args.years)
+              for week in _parse_range(args.weeks)]
+    ranked = rank_seasons(args.db, slices, args.processes, args.solver,
+                          args.store, args.output, args.resume)
+    print 'Ranked %d of %d slices.' % (len(ranked), len(slices))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
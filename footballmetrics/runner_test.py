@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import gamesdb
+import rankings
+import rankings_test
+import runner
+
+
+class RunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'games.db')
+        rankings_test.create_test_database(self.db_path, year=2010)
+        rankings_test.create_test_database(self.db_path, year=2011, seed=1)
+        self.slices = [(year, week) for year in [2010, 2011]
+                       for week in [4, 10, 17]]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertStoredRankings(self, db_path):
+        con = gamesdb.connect(db_path)
+        for year, week in self.slices:
+            ranking = rankings.FISB_Ranking(year, week)
+            ranking.load_data(self.db_path)
+            expected = ranking.calculate_ranking()
+            stored = runner.load_rankings(con, year, week)
+            self.assertEqual(sorted(stored), sorted(expected))
+            for team in expected:
+                self.assertAlmostEqual(stored[team], expected[team])
+        con.close()
+
+    def testRankSeasons(self):
+        '''Testing rankings of many slices and resuming a run...'''
+        ranked = runner.rank_seasons(self.db_path, self.slices[:2],
+                                     batch_size=1)
+        self.assertEqual(ranked, self.slices[:2])
+        ranked = runner.rank_seasons(self.db_path, self.slices)
+        self.assertEqual(ranked, self.slices[2:])
+        self.assertStoredRankings(self.db_path)
+        self.assertEqual(runner.rank_seasons(self.db_path, self.slices), [])
+        ranked = runner.rank_seasons(self.db_path, self.slices, resume=False)
+        self.assertEqual(len(ranked), 6)
+
+    def testPoolAndCLI(self):
+        '''Testing the command line interface with a process pool...'''
+        output = os.path.join(self.tmpdir, 'rankings.db')
+        runner.main(['--db', self.db_path, '--years', '2010-2011',
+                     '--weeks', '4,10,17', '--processes', '2',
+                     '--output', output])
+        self.assertStoredRankings(output)
+        con = gamesdb.connect(output)
+        self.assertEqual(len(runner.finished_slices(con)), 6)
+        con.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import json
+import os
+
+import numpy as np
+
+import standings
+from teams import TeamRegistry
+
+
+GAMES_COLUMNS = [('year', np.int16), ('week', np.int8), ('home', np.int16),
+                 ('away', np.int16), ('home_score', np.int16),
+                 ('away_score', np.int16)]
+
+STANDINGS_COLUMNS = [('year', np.int16), ('week', np.int8),
+                     ('team', np.int16), ('win', np.int16),
+                     ('loss', np.int16), ('tie', np.int16),
+                     ('points_for', np.int16), ('points_against', np.int16)]
+
+TEAMS_FILE = 'teams.json'
+
+
+def export_store(con, path):
+    '''
+    Exports the games table of the connection *con* to a columnar store in
+    the directory *path*: one .npy file per column of the games and of
+    the cumulative standings, sorted by year and week. Team names are
+    stored once in teams.json, the columns hold their ids in a
+    TeamRegistry of the sorted names.
+    '''
+    rows = con.execute('SELECT Year, Week, HomeTeam, AwayTeam, HomeScore, '
+                       'AwayScore FROM games ORDER BY Year, Week').fetchall()
+    if rows:
+        years, weeks, home, away, home_scores, away_scores = zip(*rows)
+    else:
+        years = weeks = home = away = home_scores = away_scores = ()
+    teams = TeamRegistry()
+    home, away = teams.intern(home), teams.intern(away)
+    order = teams.sort()
+    games = {'year': years, 'week': weeks, 'home': order[home],
+             'away': order[away], 'home_score': home_scores,
+             'away_score': away_scores}
+    games = dict((name, np.asarray(games[name], dtype=dtype))
+                 for name, dtype in GAMES_COLUMNS)
+    years = games['year']
+    table = dict((name, []) for name, dtype in STANDINGS_COLUMNS)
+    for year in np.unique(years):
+        season = years == year
+        season_teams, season_weeks, cumulative = standings.compute_standings(
+            games['week'][season], games['home'][season],
+            games['away'][season], games['home_score'][season],
+            games['away_score'][season], teams)
+        n_teams, n_weeks = cumulative.shape[:2]
+        table['year'].append(np.repeat(year, n_teams * n_weeks))
+        table['week'].append(np.repeat(season_weeks, n_teams))
+        table['team'].append(np.tile(teams.ids(season_teams), n_weeks))
+        values = cumulative.transpose(1, 0, 2).reshape(-1, 5)
+        for i, name in enumerate(['win', 'loss', 'tie', 'points_for',
+                                  'points_against']):
+            table[name].append(values[:, i])
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name, dtype in GAMES_COLUMNS:
+        np.save(os.path.join(path, 'games_%s.npy' % name), games[name])
+    for name, dtype in STANDINGS_COLUMNS:
+        column = np.concatenate(table[name]) if table[name] else []
+        np.save(os.path.join(path, 'standings_%s.npy' % name),
+                np.asarray(column, dtype=dtype))
+    with open(os.path.join(path, TEAMS_FILE), 'w') as f:
+        json.dump(teams.names, f)
+
+
+class SeasonStore(object):
+    '''
+    This class gives access to a columnar store written by export_store.
+    The columns are memory-mapped, so opening a store of many seasons
+    reads nothing but the team names; games and standings of a season are
+    returned as views of the mapped columns.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, TEAMS_FILE)) as f:
+            self.teams = TeamRegistry(json.load(f))
+        self.__games = self.__load('games', GAMES_COLUMNS)
+        self.__standings = self.__load('standings', STANDINGS_COLUMNS)
+
+    def years(self):
+        '''Returns the stored seasons.'''
+        return np.unique(self.__games['year']).tolist()
+
+    def games(self, year, week=None):
+        '''
+        Returns the columns of all games of the season *year* up to and
+        including *week* as a dictionary of arrays.
+        '''
+        start, end = self.__season(self.__games, year, week)
+        return dict((name, column[start:end])
+                    for name, column in self.__games.iteritems())
+
+    def iter_weeks(self, years=None):
+        '''
+        Yields the games of all seasons, or of the given *years*, week by
+        week in the format of ``standings.stream_weeks``.
+        '''
+        columns = self.__games
+        if years is None:
+            years = self.years()
+        for year in sorted(years):
+            start, end = self.__season(columns, year, None)
+            weeks = columns['week'][start:end]
+            bounds = np.flatnonzero(np.diff(weeks)) + 1
+            for first, last in zip(np.concatenate(([0], bounds)),
+                                   np.concatenate((bounds, [len(weeks)]))):
+                games = slice(start + first, start + last)
+                yield (year, int(weeks[first]),
+                       [self.teams[code] for code in columns['home'][games]],
+                       [self.teams[code] for code in columns['away'][games]],
+                       columns['home_score'][games],
+                       columns['away_score'][games])
+
+    def standings(self, year, week):
+        '''
+        Returns the columns of the standings of the season *year* after
+        *week* as a dictionary of arrays, ordered by team. If no games
+        were played in *week*, the standings of the latest week before
+        are returned.
+        '''
+        start, end = self.__season(self.__standings, year, week)
+        weeks = self.__standings['week'][start:end]
+        if len(weeks):
+            start = start + np.searchsorted(weeks, weeks[-1])
+        return dict((name, column[start:end])
+                    for name, column in self.__standings.iteritems())
+
+    def pythagorean_data(self, year, week):
+        '''
+        Returns the standings of the season *year* after *week* as data
+        dictionary for the classes of Pythagoreans.py. The number of
+        played games is given per team, teams which have not played yet
+        are left out.
+        '''
+        table = self.standings(year, week)
+        games = table['win'] + table['loss'] + table['tie']
+        played = games > 0
+        table = dict((name, column[played]) 
+                     for name, column in table.iteritems())
+        games = games[played]
+        return {'teams': [self.teams[code] for code in table['team']],
+                'pointsFor': table['points_for'],
+                'pointsAgainst': table['points_against'],
+                'wlp': (table['win'] + 0.5 * table['tie']) / 
+                       games.astype(float),
+                'nGames': games}
+
+    def __load(self, prefix, columns):
+        return dict((name, np.load(os.path.join(self.path, '%s_%s.npy' %
+                                                (prefix, name)),
+                                   mmap_mode='r'))
+                    for name, dtype in columns)
+
+    def __season(self, columns, year, week):
+        # the columns are sorted by year and week
+        years = columns['year']
+        start = np.searchsorted(years, year)
+        end = np.searchsorted(years, year, side='right')
+        if week is not None:
+            end = start + np.searchsorted(columns['week'][start:end], week,
+                                          side='right')
+        return start, end
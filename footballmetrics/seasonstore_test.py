@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gamesdb
+import Pythagoreans
+import rankings
+import rankings_test
+import seasonstore
+import standings
+
+
+class SeasonStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'games.db')
+        rankings_test.create_test_database(self.db_path, year=2011)
+        rankings_test.create_test_database(self.db_path, year=2012, seed=1)
+        self.store_path = os.path.join(self.tmpdir, 'store')
+        con = gamesdb.connect(self.db_path)
+        seasonstore.export_store(con, self.store_path)
+        con.close()
+        self.store = seasonstore.SeasonStore(self.store_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testMemoryMapped(self):
+        '''Testing that the store columns are memory-mapped views...'''
+        games = self.store.games(2012, 10)
+        self.assertEqual(self.store.years(), [2011, 2012])
+        self.assertTrue(isinstance(games['home'], np.memmap))
+        self.assertEqual(games['home_score'].dtype, np.int16)
+        self.assertTrue(np.all(games['year'] == 2012))
+        self.assertTrue(np.all(games['week'] <= 10))
+
+    def testRankingFromStore(self):
+        '''Testing FISB_Ranking loaded from the store against SQLite...'''
+        for week in [5, 17]:
+            sql = rankings.FISB_Ranking(2012, week)
+            sql.load_data(self.db_path)
+            store = rankings.FISB_Ranking(2012, week)
+            store.load_store(self.store)
+            self.assertEqual(store.teams, sql.teams)
+            self.assertEqual(sorted(store.games), sorted(sql.games))
+            expected = sql.calculate_ranking()
+            ratings = store.calculate_ranking()
+            for team in expected:
+                self.assertAlmostEqual(ratings[team], expected[team])
+
+    def testStandings(self):
+        '''Testing the stored standings against season_standings...'''
+        con = gamesdb.connect(self.db_path)
+        expected = standings.season_standings(con, 2011)
+        con.close()
+        expected = expected[expected.Week == 9]
+        table = self.store.standings(2011, 9)
+        self.assertEqual([self.store.teams[i] for i in table['team']],
+                         list(expected.Team))
+        self.assertEqual(table['win'].tolist(), expected.Win.tolist())
+        self.assertEqual(table['points_against'].tolist(),
+                         expected.PointsAgainst.tolist())
+
+    def testPythagoreanData(self):
+        '''Testing a Pythagorean fit on data from the store...'''
+        dataDict = self.store.pythagorean_data(2011, 17)
+        self.assertEqual(len(dataDict['teams']), 8)
+        self.assertTrue(np.all(dataDict['nGames'] == 28))
+        pyth = Pythagoreans.Pythagenpat(dataDict)
+        pyth.calculatePythagorean()
+        self.assertEqual(len(pyth.prediction), 8)
+        # teams with a bye in the first week are left out
+        dataDict = self.store.pythagorean_data(2011, 1)
+        self.assertEqual(len(dataDict['teams']), 6)
+        self.assertTrue(np.all(dataDict['nGames'] > 0))
+        pyth = Pythagoreans.Pythagenport(dataDict)
+        prediction, power = pyth.calculatePythagorean()
+        self.assertTrue(np.all(np.isfinite(prediction)))
+        self.assertTrue(np.all(np.isfinite(power)))
+
+
+if __name__ == "__main__":
+    unittest.main()
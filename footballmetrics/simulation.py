@@ -0,0 +1,141 @@
+import numpy as np
+
+import instrument
+import standings
+from teams import TeamRegistry
+
+
+def load_schedule(con, year, after_week):
+    '''
+    Returns the games of the season *year* after the week *after_week*
+    from the games table of the connection *con* as list of (week, home
+    team, away team) tuples. Their scores, if already known, are ignored.
+    Note that only played games are stored in the games table (the
+    fetcher rejects games without score), so this schedule is only 
+    complete when replaying a past season. For the odds of a running 
+    season the remaining schedule needs to be given explicitly.
+    '''
+    return con.execute('SELECT Week, HomeTeam, AwayTeam FROM games '
+                       'WHERE Year=? AND Week>? ORDER BY Week',
+                       (year, after_week)).fetchall()
+
+
+class SeasonSimulator(object):
+    '''
+    This class simulates the rest of a season from FISB ratings. The home
+    margin of every remaining game is drawn from a normal distribution
+    with the mean rating(home) - rating(away) + home field advantage and
+    the standard deviation *residual_std*, e.g. the residual spread of
+    the fit (see ``FISB_Ranking.residual_std``).
+    *ratings* is the dictionary returned by ``calculate_ranking``,
+    *schedule* a list of (week, home team, away team) tuples and
+    *records* an optional dictionary of the current (win, loss, tie)
+    record of every team. Teams without a rating, e.g. teams which have 
+    not played yet, get the rating *prior*; the default 0 is the league 
+    mean of the normalized ratings.
+    '''
+    def __init__(self, ratings, residual_std, schedule, records=None, 
+                 prior=0.):
+        self.registry = TeamRegistry(sorted(team for team in ratings
+                                            if team != 'Home field advantage'))
+        self.residual_std = residual_std
+        records = records or {}
+        for team in records:
+            self.registry.intern([team])
+        schedule = list(schedule)
+        self.home = self.registry.intern([game[1] for game in schedule])
+        self.away = self.registry.intern([game[2] for game in schedule])
+        strength = np.array([ratings.get(team, prior) 
+                             for team in self.registry])
+        self.mean_margins = (strength[self.home] - strength[self.away] +
+                             ratings['Home field advantage'])
+        self.records = np.array([records.get(team, (0, 0, 0))
+                                 for team in self.registry], dtype=int)
+
+    @classmethod
+    def from_ranking(cls, ranking, con, schedule=None, prior=0.):
+        '''
+        Creates the simulator of the games after ``ranking.week`` of the
+        season ``ranking.year``, starting from the standings after 
+        ``ranking.week`` in the games table of the connection *con*. Uses
+        the ratings of ``ranking``, which are calculated if necessary.
+        The remaining games are given by *schedule* as list of (week, home
+        team, away team) tuples; by default they are read with 
+        ``load_schedule``, which only works for past seasons.
+        '''
+        if not getattr(ranking, 'ratings', None):
+            ranking.calculate_ranking()
+        table = standings.season_standings(con, ranking.year)
+        table = table[table.Week <= ranking.week]
+        records = {}
+        if len(table):
+            table = table[table.Week == table.Week.max()]
+            # teams which have not played yet have no rating and no record
+            records = dict((team, (win, loss, tie)) for team, win, loss, tie
+                           in zip(table.Team, table.Win, table.Loss,
+                                  table.Tie) if team in ranking.ratings)
+        if schedule is None:
+            schedule = load_schedule(con, ranking.year, ranking.week)
+        return cls(ranking.ratings, ranking.residual_std(), schedule, 
+                   records, prior)
+
+    @property
+    def teams(self):
+        return self.registry.names
+
+    def simulate(self, n_seasons=10000, chunk_size=10000, seed=None):
+        '''
+        Simulates the remaining games *n_seasons* times. The seasons are
+        drawn in chunks of *chunk_size*, and only the counts of the win
+        totals and final ranks are kept, so the memory is bounded by the
+        size of a chunk.
+        Returns a dictionary with the keys
+
+        * 'expected_wins' - mean number of wins of every team
+        * 'wins' - probabilities of 0, 1, ..., n total wins of every team
+        * 'rank' - probabilities of finishing 1st, 2nd, ... of the league
+          by wins (ties are broken at random) of every team
+
+        each holding a value per team.
+        '''
+        rng = np.random.RandomState(seed)
+        n_teams = len(self.registry)
+        n_games = len(self.mean_margins)
+        # incidence of the teams in the games
+        home = np.zeros((n_games, n_teams))
+        home[np.arange(n_games), self.home] = 1
+        away = np.zeros((n_games, n_teams))
+        away[np.arange(n_games), self.away] = 1
+        max_wins = self.records[:, 0].max() + n_games + 1
+        win_counts = np.zeros(n_teams * max_wins, dtype=np.int64)
+        rank_counts = np.zeros(n_teams * n_teams, dtype=np.int64)
+        team_offsets = np.arange(n_teams) * max_wins
+        rank_offsets = np.arange(n_teams) * n_teams
+        total_wins = 0.
+        with instrument.stage('simulation.simulate'):
+            for start in xrange(0, n_seasons, chunk_size):
+                size = min(chunk_size, n_seasons - start)
+                margins = (self.mean_margins + self.residual_std *
+                           rng.standard_normal((size, n_games)))
+                home_wins = margins > 0
+                wins = (np.dot(home_wins, home) + np.dot(~home_wins, away) +
+                        self.records[:, 0]).astype(int)
+                total_wins += wins.sum(axis=0)
+                win_counts += np.bincount((wins + team_offsets).ravel(),
+                                          minlength=len(win_counts))
+                # random fractions only break ties of equal win totals
+                order = np.argsort(-(wins + rng.random_sample(wins.shape)),
+                                   axis=1)
+                ranks = np.empty_like(order)
+                ranks[np.arange(size)[:, np.newaxis], order] = \
+                    np.arange(n_teams)
+                rank_counts += np.bincount((ranks + rank_offsets).ravel(),
+                                           minlength=len(rank_counts))
+        instrument.count('simulation.simulate', 'games', n_seasons * n_games)
+        wins = win_counts.reshape(n_teams, max_wins) / float(n_seasons)
+        ranks = rank_counts.reshape(n_teams, n_teams) / float(n_seasons)
+        expected_wins = np.zeros(n_teams) + total_wins / float(n_seasons)
+        return {'expected_wins': dict(zip(self.teams,
+                                          map(float, expected_wins))),
+                'wins': dict(zip(self.teams, wins)),
+                'rank': dict(zip(self.teams, ranks))}
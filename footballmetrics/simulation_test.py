@@ -0,0 +1,89 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import gamesdb
+import rankings
+import rankings_test
+import simulation
+
+
+class SeasonSimulatorTest(unittest.TestCase):
+    ratings = {'A': 7., 'B': 0., 'C': -7., 'Home field advantage': 3.}
+    schedule = [(1, 'A', 'B'), (1, 'C', 'A'), (2, 'B', 'C'), (2, 'A', 'C')]
+
+    def testDeterministic(self):
+        '''Testing a simulation without residual spread...'''
+        simulator = simulation.SeasonSimulator(self.ratings, 1e-9,
+                                               self.schedule,
+                                               {'B': (2, 0, 0)})
+        result = simulator.simulate(100, chunk_size=30, seed=0)
+        self.assertEqual(result['expected_wins'],
+                         {'A': 3., 'B': 3., 'C': 0.})
+        self.assertEqual(result['wins']['B'][3], 1.)
+        self.assertEqual(result['rank']['C'].tolist(), [0., 0., 1.])
+        self.assertAlmostEqual(result['rank']['A'][0], 0.5, delta=0.15)
+
+    def testProbabilities(self):
+        '''Testing simulated win probabilities against the normal CDF...'''
+        simulator = simulation.SeasonSimulator(self.ratings, 13.,
+                                               self.schedule[:1])
+        result = simulator.simulate(200000, chunk_size=50000, seed=1)
+        expected = 0.5 * (1 + math.erf(10. / 13. / math.sqrt(2)))
+        self.assertAlmostEqual(result['expected_wins']['A'], expected,
+                               delta=0.005)
+        for team in simulator.teams:
+            self.assertAlmostEqual(result['wins'][team].sum(), 1.)
+            self.assertAlmostEqual(result['rank'][team].sum(), 1.)
+
+    def testPrior(self):
+        '''Testing teams without rating...'''
+        simulator = simulation.SeasonSimulator(self.ratings, 1e-9,
+                                               [(3, 'A', 'D'), (3, 'D', 'C')],
+                                               prior=-20.)
+        result = simulator.simulate(10, seed=0)
+        self.assertEqual(result['expected_wins']['D'], 0.)
+        self.assertEqual(result['expected_wins']['A'], 1.)
+        self.assertEqual(result['expected_wins']['C'], 1.)
+
+    def testFromRanking(self):
+        '''Testing a simulation of the rest of a season in the database...'''
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmpdir, 'games.db')
+            rankings_test.create_test_database(db_path)
+            ranking = rankings.FISB_Ranking(2011, 10)
+            ranking.load_data(db_path)
+            con = gamesdb.connect(db_path)
+            simulator = simulation.SeasonSimulator.from_ranking(ranking, con)
+            n_remaining = len(simulation.load_schedule(con, 2011, 10))
+            # in the first week not all teams have played
+            first_week = rankings.FISB_Ranking(2011, 1)
+            first_week.load_data(db_path)
+            schedule = [(2, 'Team3', 'Team5'), (2, 'Team0', 'Team3')]
+            early = simulation.SeasonSimulator.from_ranking(first_week, con,
+                                                            schedule)
+            con.close()
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertTrue(ranking.residual_std() > 0)
+        self.assertEqual(len(simulator.mean_margins), n_remaining)
+        result = simulator.simulate(1000, chunk_size=300, seed=2)
+        total = sum(result['expected_wins'].values())
+        played = simulator.records[:, 0].sum()
+        self.assertAlmostEqual(total, played + n_remaining)
+        self.assertTrue(result['expected_wins']['Team7'] >
+                        result['expected_wins']['Team0'])
+        self.assertTrue('Team5' not in first_week.ratings)
+        self.assertEqual(len(early.mean_margins), 2)
+        result = early.simulate(100, seed=3)
+        self.assertAlmostEqual(sum(result['expected_wins'].values()),
+                               early.records[:, 0].sum() + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import itertools
+
+import numpy as np
+
+import gamesdb
+import instrument
+from teams import TeamRegistry
+
+
+STANDINGS_DTYPE = [('Year', int), ('Week', int), ('Team', object), 
+                   ('Win', int), ('Loss', int), ('Tie', int), 
+                   ('PointsFor', int), ('PointsAgainst', int)]
+
+
+def compute_standings(weeks, home_teams, away_teams, home_scores, 
+                      away_scores, registry=None):
+    '''
+    Computes the cumulative standings of a season from the arrays of its
+    games. Returns the sorted teams, the sorted distinct weeks and an array
+    of shape (teams, weeks, 5) holding win, loss, tie, points for and 
+    points against of every team after every week.
+    The teams may be given by name or, if a *registry* is given, as ids 
+    of this TeamRegistry.
+    '''
+    weeks = np.asarray(weeks)
+    home_scores = np.asarray(home_scores)
+    away_scores = np.asarray(away_scores)
+    n_games = len(weeks)
+    if registry is None:
+        registry = TeamRegistry()
+        home_teams = registry.intern(home_teams)
+        away_teams = registry.intern(away_teams)
+    ids, team_ids = np.unique(np.concatenate((home_teams, away_teams)),
+                              return_inverse=True)
+    teams = [registry[i] for i in ids]
+    order = np.argsort(teams, kind='mergesort')
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
+    teams, team_ids = [teams[i] for i in order], rank[team_ids]
+    distinct_weeks, week_ids = np.unique(weeks, return_inverse=True)
+    # one row per team and game: first the home teams, then the away teams
+    scored = np.concatenate((home_scores, away_scores))
+    allowed = np.concatenate((away_scores, home_scores))
+    results = np.column_stack((scored > allowed, scored < allowed, 
+                               scored == allowed, scored, allowed))
+    table = np.zeros((len(teams), len(distinct_weeks), 5), dtype=np.int64)
+    np.add.at(table, (team_ids, np.tile(week_ids, 2)), results)
+    return teams, distinct_weeks, np.cumsum(table, axis=1)
+
+
+def season_standings(con, year):
+    '''
+    Computes the standings of every team after every week of the *year* 
+    season directly from the games table of the connection *con*, 
+    without storing them. Returns a record array with the fields of
+    STANDINGS_DTYPE, ordered by week and team.
+    '''
+    games = con.execute('SELECT Week, HomeTeam, AwayTeam, HomeScore, '
+                        'AwayScore FROM games WHERE Year=?', 
+                        (year,)).fetchall()
+    result = np.zeros(0, dtype=STANDINGS_DTYPE).view(np.recarray)
+    if not games:
+        return result
+    weeks, home, away, home_scores, away_scores = zip(*games)
+    teams, weeks, table = compute_standings(weeks, home, away, home_scores,
+                                            away_scores)
+    result = np.zeros(len(teams) * len(weeks), dtype=STANDINGS_DTYPE)
+    result['Year'] = year
+    result['Week'] = np.repeat(weeks, len(teams))
+    result['Team'] = teams * len(weeks)
+    values = table.transpose(1, 0, 2).reshape(-1, 5)
+    for i, field in enumerate(['Win', 'Loss', 'Tie', 'PointsFor', 
+                               'PointsAgainst']):
+        result[field] = values[:, i]
+    return result.view(np.recarray)
+
+
+def stream_weeks(con, years=None):
+    '''
+    Streams the games of the connection *con* in (year, week) order, 
+    optionally only of the given *years*. Yields one tuple (year, week, 
+    home teams, away teams, home scores, away scores) per week, the rows
+    are read from the cursor while iterating.
+    '''
+    if years is None:
+        cur = con.execute('SELECT Year, Week, HomeTeam, AwayTeam, HomeScore, '
+                          'AwayScore FROM games ORDER BY Year, Week')
+    else:
+        years = list(years)
+        cur = con.execute('SELECT Year, Week, HomeTeam, AwayTeam, HomeScore, '
+                          'AwayScore FROM games WHERE Year IN (%s) '
+                          'ORDER BY Year, Week' % ', '.join('?' * len(years)),
+                          years)
+    for (year, week), games in itertools.groupby(cur, 
+                                                 lambda game: game[:2]):
+        home, away, home_scores, away_scores = zip(*games)[2:]
+        yield year, week, home, away, home_scores, away_scores
+
+
+def pythagorean_feed(weeks):
+    '''
+    Keeps running totals of the standings of a stream of *weeks* as 
+    yielded by ``stream_weeks`` or ``SeasonStore.iter_weeks``, which 
+    need to be in (year, week) order. Yields (year, week, dataDict) after
+    every week, where dataDict holds the teams, points for and against, 
+    winning percentages and the number of games of every team which has
+    played in the season so far, ready for the classes of Pythagoreans.py.
+    The teams are in the order of their first game. Only the totals of 
+    the current season are kept, the totals are reset with a new year.
+    '''
+    year = None
+    for week_year, week, home, away, home_scores, away_scores in weeks:
+        if week_year != year:
+            year = week_year
+            registry = TeamRegistry()
+            totals = np.zeros((0, 5), dtype=np.int64)
+        home, away = registry.intern(home), registry.intern(away)
+        if len(registry) > len(totals):
+            totals = np.vstack((totals, np.zeros((len(registry) - 
+                                                  len(totals), 5), 
+                                                 dtype=np.int64)))
+        home_scores = np.asarray(home_scores)
+        away_scores = np.asarray(away_scores)
+        for teams, scored, allowed in [(home, home_scores, away_scores),
+                                       (away, away_scores, home_scores)]:
+            np.add.at(totals, teams, np.column_stack((scored > allowed, 
+                                                      scored < allowed, 
+                                                      scored == allowed,
+                                                      scored, allowed)))
+        games = totals[:, :3].sum(axis=1)
+        yield year, week, {'teams': list(registry.names), 
+                           'pointsFor': totals[:, 3].copy(),
+                           'pointsAgainst': totals[:, 4].copy(),
+                           'wlp': (totals[:, 0] + 0.5 * totals[:, 2]) / 
+                                  games.astype(float),
+                           'nGames': games}
+
+
+def store_standings(con, years):
+    '''
+    Rebuilds the standings table rows of all *years* from the games 
+    table. Every season is read with a single query and written with 
+    one executemany in a single transaction.
+    '''
+    gamesdb.create_schema(con)
+    with instrument.stage('standings.store_standings'), con:
+        for year in years:
+            standings = season_standings(con, year)
+            con.execute('DELETE FROM standings WHERE Year=?', (year,))
+            con.executemany('INSERT INTO standings (Year, Week, Team, Win, '
+                            'Loss, Tie, PointFor, PointsAgainst) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
+                            standings.tolist())
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fetchPFRdata
+import gamesdb
+import Pythagoreans
+import seasonstore
+import standings
+
+
+class StandingsTest(unittest.TestCase):
+    games = [(2011, 1, 'A', 'B', 21, 14),
+             (2011, 1, 'C', 'D', 10, 10),
+             (2011, 2, 'B', 'C', 7, 3),
+             (2011, 2, 'D', 'A', 28, 24),
+             (2012, 1, 'A', 'C', 3, 6)]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'games.db')
+        con = gamesdb.connect(self.db_path)
+        gamesdb.insert_games(con, self.games)
+        con.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testSeasonStandings(self):
+        '''Testing cumulative standings of a season...'''
+        con = gamesdb.connect(self.db_path)
+        result = standings.season_standings(con, 2011)
+        con.close()
+        self.assertEqual(result.tolist(), [
+            (2011, 1, 'A', 1, 0, 0, 21, 14),
+            (2011, 1, 'B', 0, 1, 0, 14, 21),
+            (2011, 1, 'C', 0, 0, 1, 10, 10),
+            (2011, 1, 'D', 0, 0, 1, 10, 10),
+            (2011, 2, 'A', 1, 1, 0, 45, 42),
+            (2011, 2, 'B', 1, 1, 0, 21, 24),
+            (2011, 2, 'C', 0, 1, 1, 13, 17),
+            (2011, 2, 'D', 1, 0, 1, 38, 34)])
+
+    def testGetStandings(self):
+        '''Testing that fetchStandings stores the standings table...'''
+        fetchPFRdata.fetchStandings([2011, 2012],
+                                    dbPath=self.db_path).getStandings()
+        con = gamesdb.connect(self.db_path)
+        rows = con.execute('select Year, Week, Team, Win, Loss, Tie, '
+                           'PointFor, PointsAgainst from standings '
+                           'where Year=2012 order by Team').fetchall()
+        count = con.execute('select count(*) from standings').fetchone()[0]
+        con.close()
+        self.assertEqual(count, 10)
+        self.assertEqual(rows, [(2012, 1, 'A', 0, 1, 0, 3, 6),
+                                (2012, 1, 'C', 1, 0, 0, 6, 3)])
+
+    def testPythagoreanFeed(self):
+        '''Testing the weekly data dictionaries of the streaming feed...'''
+        con = gamesdb.connect(self.db_path)
+        feed = list(standings.pythagorean_feed(standings.stream_weeks(con)))
+        expected = standings.season_standings(con, 2011)
+        con.close()
+        self.assertEqual([(year, week) for year, week, data in feed],
+                         [(2011, 1), (2011, 2), (2012, 1)])
+        year, week, data = feed[1]
+        order = [data['teams'].index(team) for team in expected.Team[4:]]
+        self.assertEqual(data['pointsFor'][order].tolist(),
+                         expected.PointsFor[4:].tolist())
+        self.assertEqual(data['nGames'][order].tolist(), [2, 2, 2, 2])
+        self.assertEqual(data['wlp'][order].tolist(), [0.5, 0.5, 0.25, 0.75])
+        year, week, data = feed[2]
+        self.assertEqual(sorted(data['teams']), ['A', 'C'])
+        self.assertEqual(data['pointsAgainst'].tolist(), [6, 3])
+        pyth = Pythagoreans.Pythagenpat(feed[1][2])
+        self.assertEqual(len(pyth.calculatePythagorean()[0]), 4)
+
+    def testStoreFeed(self):
+        '''Testing the feed of the season store against the database...'''
+        con = gamesdb.connect(self.db_path)
+        seasonstore.export_store(con, os.path.join(self.tmpdir, 'store'))
+        expected = list(standings.pythagorean_feed(
+            standings.stream_weeks(con, [2012])))
+        con.close()
+        store = seasonstore.SeasonStore(os.path.join(self.tmpdir, 'store'))
+        self.assertEqual(len(list(store.iter_weeks())), 3)
+        feed = list(standings.pythagorean_feed(store.iter_weeks([2012])))
+        self.assertEqual(len(feed), 1)
+        for key in ['pointsFor', 'pointsAgainst', 'wlp', 'nGames']:
+            self.assertEqual(feed[0][2][key].tolist(),
+                             expected[0][2][key].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class TeamRegistry(object):
+    '''
+    This class interns team names to integer ids, so that games and
+    standings can be kept as arrays of ids instead of repeated strings.
+    Names are converted to str once, when they are interned; the id of a
+    team is its index in ``names``.
+    '''
+    def __init__(self, names=()):
+        self.names = []
+        self.__ids = {}
+        self.intern(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, team_id):
+        return self.names[team_id]
+
+    def __contains__(self, name):
+        return name in self.__ids
+
+    def intern(self, names):
+        '''
+        Returns the ids of the given *names* as an integer array. Names
+        which are not registered yet get the next free ids.
+        '''
+        ids = self.__ids
+        result = []
+        for name in names:
+            try:
+                result.append(ids[name])
+            except KeyError:
+                name = str(name)
+                ids[name] = len(self.names)
+                self.names.append(name)
+                result.append(ids[name])
+        return np.array(result, dtype=int)
+
+    def ids(self, names):
+        '''
+        Returns the ids of the given *names* as an integer array, raises a
+        KeyError for names which are not registered.
+        '''
+        return np.array([self.__ids[name] for name in names], dtype=int)
+
+    def sort(self):
+        '''
+        Renumbers the teams in the order of their names. Returns an array
+        which maps the old ids to the new ones.
+        '''
+        order = np.argsort(self.names, kind='mergesort')
+        mapping = np.empty(len(order), dtype=int)
+        mapping[order] = np.arange(len(order))
+        self.names = [self.names[i] for i in order]
+        self.__ids = dict((name, i) for i, name in enumerate(self.names))
+        return mapping
@@ -0,0 +1,30 @@
+import unittest
+
+import teams
+
+
+class TeamRegistryTest(unittest.TestCase):
+    def testIntern(self):
+        '''Testing that names are interned to stable ids...'''
+        registry = teams.TeamRegistry()
+        ids = registry.intern(['Chicago Bears', u'Atlanta Falcons',
+                               'Chicago Bears'])
+        self.assertEqual(ids.tolist(), [0, 1, 0])
+        self.assertEqual(registry.intern(['Atlanta Falcons']).tolist(), [1])
+        self.assertEqual(len(registry), 2)
+        self.assertTrue(isinstance(registry[1], str))
+        self.assertTrue('Chicago Bears' in registry)
+        self.assertRaises(KeyError, registry.ids, ['Green Bay Packers'])
+
+    def testSort(self):
+        '''Testing renumbering of the teams by name...'''
+        registry = teams.TeamRegistry(['C', 'A', 'B'])
+        ids = registry.ids(['C', 'A', 'B'])
+        mapping = registry.sort()
+        self.assertEqual(registry.names, ['A', 'B', 'C'])
+        self.assertEqual(mapping[ids].tolist(), [2, 0, 1])
+        self.assertEqual(registry.ids(['C', 'A']).tolist(), [2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
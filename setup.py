@@ -6,13 +6,13 @@ setup(
     author='Andy Goldschmidt',
     author_email='andygoldschmidt@me.com',
     packages=['footballmetrics'],
+    scripts=['scripts/footballmetrics-rank'],
     url='http://www.footballissexbaby.de',
     license='GPL',
     description='A package for statistical analysis of football data.',
     long_description=open('README').read(),
     install_requires=[
-        "numpy >= 1.6.0",
+        "numpy >= 1.14.0",
         "scipy >= 0.10.0",
-        "html5lib >= 0.95",
     ],
 )
\ No newline at end of file